@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from filters import DEFAULT_MODEL, DETECT_FILTER, FILTER_NAMES, compile_filter_chain, validate_filter_chain
+from detection_backends import BACKENDS, CALIBRATION_DIR, resolve_model
+# Processamento em lote (sem interface gráfica) de pastas de imagens.
+# Não importa tkinter: pode rodar em servidores sem display.
+#
+# Exemplo:
+#   python batch.py fotos/ saida/ --filters blur,canny --workers 8
+#   python batch.py fotos/ saida/ --filters detect_objects --backend openvino --int8
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+# Estado de cada processo trabalhador (inicializado uma vez por processo)
+_worker_pipeline = None
+_worker_jpeg_quality = 95
+
+
+def _init_worker(filter_names, model_path, jpeg_quality):
+    global _worker_pipeline, _worker_jpeg_quality
+    # Um processo por núcleo: evitar que o OpenCV crie threads extras em cada um
+    cv2.setNumThreads(1)
+    _worker_jpeg_quality = jpeg_quality
+    detector = None
+    if DETECT_FILTER in filter_names:
+        # Imagens independentes: detecção em todas (sem rastreamento entre elas)
+        from detection import load_detector
+        detector = load_detector(model_path)
+    _worker_pipeline = compile_filter_chain(filter_names, detector)
+
+
+def _process_image(paths):
+    src, dst = paths
+    try:
+        frame = cv2.imread(src)
+        if frame is None:
+            return src, "A imagem não foi carregada corretamente."
+        frame = _worker_pipeline(frame)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        params = []
+        if dst.lower().endswith(('.jpg', '.jpeg')):
+            params = [cv2.IMWRITE_JPEG_QUALITY, _worker_jpeg_quality]
+        if not cv2.imwrite(dst, frame, params):
+            return src, f"Não foi possível salvar {dst}"
+    except Exception as e:
+        return src, str(e)
+    return src, None
+
+
+# Percorre a árvore de entrada e gera os pares (origem, destino) espelhando as subpastas
+def collect_images(input_dir, output_dir, output_ext=None):
+    for dirpath, dirnames, filenames in os.walk(input_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            src = os.path.join(dirpath, filename)
+            rel = os.path.relpath(src, input_dir)
+            if output_ext:
+                rel = os.path.splitext(rel)[0] + output_ext
+            yield src, os.path.join(output_dir, rel)
+
+
+def run_batch(input_dir, output_dir, filter_names, workers=None, model_path=DEFAULT_MODEL,
+              output_ext=None, jpeg_quality=95, chunksize=16, progress_every=500):
+    validate_filter_chain(filter_names)
+    # Não sobrescrever a própria entrada
+    if os.path.abspath(input_dir) == os.path.abspath(output_dir) and not output_ext:
+        raise ValueError("A pasta de saída deve ser diferente da pasta de entrada.")
+    jobs = list(collect_images(input_dir, output_dir, output_ext))
+    if not jobs:
+        print(f"Nenhuma imagem encontrada em {input_dir}")
+        return 0, []
+
+    errors = []
+    processed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(filter_names, model_path, jpeg_quality)) as executor:
+        for src, error in executor.map(_process_image, jobs, chunksize=chunksize):
+            processed += 1
+            if error:
+                errors.append((src, error))
+            if progress_every and processed % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{processed}/{len(jobs)} imagens ({processed / elapsed:.1f} img/s)")
+
+    elapsed = time.perf_counter() - start
+    ok = processed - len(errors)
+    print(f"Concluído: {ok} imagens em {elapsed:.2f}s ({ok / elapsed:.1f} img/s), {len(errors)} erro(s)")
+    return ok, errors
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Aplica uma cadeia de filtros a uma pasta de imagens (sem interface).")
+    parser.add_argument("input_dir", help="Pasta de entrada (percorrida recursivamente)")
+    parser.add_argument("output_dir", help="Pasta de saída (mesma estrutura de subpastas)")
+    parser.add_argument("--filters", required=True,
+                        help=f"Cadeia de filtros separada por vírgulas, aplicada em ordem. Opções: {', '.join(FILTER_NAMES)}")
+    parser.add_argument("--workers", type=int, default=None, help="Número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Pesos do YOLO para 'detect_objects'")
+    parser.add_argument("--backend", choices=BACKENDS, default="pytorch",
+                        help="Runtime da detecção (os pesos são exportados na primeira vez)")
+    parser.add_argument("--int8", action="store_true", help="Modelo quantizado em INT8 (backends onnx e openvino)")
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR, help="Imagens de calibração do INT8")
+    parser.add_argument("--ext", default=None, help="Extensão de saída, ex.: .png (padrão: a mesma da entrada)")
+    parser.add_argument("--jpeg-quality", type=int, default=95)
+    parser.add_argument("--chunksize", type=int, default=16, help="Imagens enviadas por vez a cada processo")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    filter_names = [name.strip() for name in args.filters.split(",") if name.strip()]
+    output_ext = args.ext if not args.ext or args.ext.startswith(".") else "." + args.ext
+    try:
+        model_path = args.model
+        if DETECT_FILTER in filter_names:
+            # Exportar uma vez aqui, e não em cada processo trabalhador
+            model_path = resolve_model(args.model, args.backend, args.int8, args.calibration_dir)
+        _, errors = run_batch(args.input_dir, args.output_dir, filter_names, workers=args.workers,
+                              model_path=model_path, output_ext=output_ext,
+                              jpeg_quality=args.jpeg_quality, chunksize=args.chunksize)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 2
+
+    for src, error in errors:
+        print(f"Erro em {src}: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
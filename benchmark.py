@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+from filters import DEFAULT_MODEL, DETECT_FILTER, FILTERS, compile_filter_chain
+from display import DisplayBuffer, fit_to_canvas
+from export import SegmentExport, segment_ranges, verify_parallel_export
+from recorder import AsyncRecorder
+from video_io import FrameReader
+# Benchmark reprodutível (sem interface gráfica) sobre as imagens de images/ e os vídeos
+# de videos/: cada filtro em várias resoluções, a conversão de exibição de show_frame,
+# a detecção, a decodificação, a exportação de segmentos, a gravação e o tempo de import
+# da interface (main.py) até ela poder abrir a janela.
+# A suíte de exportação também confere que a saída paralela é igual, frame a frame, à da
+# leitura sequencial; uma verificação que falha faz o benchmark terminar com erro.
+# O resultado vai para um JSON com as informações da máquina; --compare aponta as
+# regressões em relação a um JSON anterior (por exemplo, de outro commit).
+#
+# Exemplo:
+#   python benchmark.py --output bench_antes.json
+#   python benchmark.py --output bench_depois.json --compare bench_antes.json
+
+SUITES = ('filters', 'display', 'detection', 'decode', 'export', 'record', 'startup')
+RESOLUTIONS = ((640, 360), (1280, 720), (1920, 1080), (3840, 2160))
+CANVAS_SIZE = (1280, 720)   # área de exibição usada no benchmark de show_frame
+IMAGES_DIR = "images"
+VIDEOS_DIR = "videos"
+REGRESSION_THRESHOLD = 0.10
+DECODE_TIMEOUT = 300.0      # limite (s) para ler o vídeo inteiro
+
+
+# Executa fn repeat vezes (depois de warmup execuções descartadas); tempos em ms
+def time_call(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    p50, p95 = np.percentile(samples, (50, 95))
+    return {'median_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+            'min_ms': round(min(samples), 3), 'samples': repeat}
+
+
+def throughput(frames, seconds):
+    return {'fps': round(frames / seconds, 2) if seconds > 0 else 0.0, 'frames': frames,
+            'seconds': round(seconds, 3)}
+
+
+def first_file(directory, extensions):
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(extensions))
+    if not names:
+        raise ValueError(f"Nenhum arquivo {'/'.join(extensions)} em {directory}")
+    return os.path.join(directory, names[0])
+
+
+def load_image(path):
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"A imagem não foi carregada corretamente: {path}")
+    return image
+
+
+def read_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def bench_filters(image, repeat):
+    results = {}
+    for width, height in RESOLUTIONS:
+        frame = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        for name in FILTERS:
+            pipeline = compile_filter_chain([name])
+            results[f"filtro/{name}/{width}x{height}"] = time_call(lambda: pipeline(frame), repeat)
+    return results
+
+
+# Mesmo caminho de VideoImageProcessor.render_frame, sem a cópia para o PhotoImage (Tk)
+def bench_display(image, repeat):
+    results = {}
+    for width, height in RESOLUTIONS:
+        frame = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        buffer = DisplayBuffer()
+
+        def convert():
+            _, size, _ = fit_to_canvas(frame.shape, *CANVAS_SIZE)
+            buffer.convert(frame, size)
+        results[f"exibicao/{width}x{height}"] = time_call(convert, repeat)
+    return results
+
+
+def bench_detection(image, repeat, model_path):
+    try:
+        from detection import load_detector
+        detector = load_detector(model_path)
+    except Exception as e:
+        return {}, f"{type(e).__name__}: {e}"
+    results = {}
+    for width, height in RESOLUTIONS[:3]:
+        frame = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        results[f"deteccao/{width}x{height}"] = time_call(lambda: detector.detect(frame), repeat)
+    batch = [cv2.resize(image, RESOLUTIONS[1], interpolation=cv2.INTER_AREA)] * 8
+    timing = time_call(lambda: detector.detect_batch(batch), max(1, repeat // 4))
+    results["deteccao/lote8/1280x720"] = timing
+    return results, None
+
+
+# Leitura pelo FrameReader (thread de decodificação) do vídeo inteiro, uma vez.
+# CAP_PROP_FRAME_COUNT é só uma estimativa: a leitura também termina quando o leitor chega
+# ao fim do arquivo ou depois de timeout segundos
+def bench_decode(video_path, frame_step=1, timeout=DECODE_TIMEOUT):
+    cap = cv2.VideoCapture(video_path)
+    reader = FrameReader(cap, loop=False)
+    reader.frame_step = frame_step
+    total = reader.frame_count
+    delivered = 0
+    last_index = -1
+    start = time.perf_counter()
+    reader.start()
+    try:
+        while last_index + frame_step < total:
+            item = reader.read()
+            if item is None:
+                if reader.finished():
+                    break
+                if time.perf_counter() - start > timeout:
+                    print(f"Aviso: decodificação interrompida após {timeout:.0f} s")
+                    break
+                time.sleep(0.0005)
+                continue
+            delivered += 1
+            last_index = item[0]
+        elapsed = time.perf_counter() - start
+    finally:
+        reader.stop()
+        cap.release()
+    return throughput(delivered, elapsed)
+
+
+def export_segments(video_path, frames):
+    cap = cv2.VideoCapture(video_path)
+    frames = min(frames, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    cap.release()
+    return segment_ranges([frames * i // 4 for i in range(1, 4)], frames)
+
+
+def bench_export(video_path, frames, filter_names):
+    segments = export_segments(video_path, frames)
+    results = {}
+    for mode in ("single_pass", "parallel"):
+        with tempfile.TemporaryDirectory() as save_dir:
+            start = time.perf_counter()
+            export = SegmentExport(video_path, segments, save_dir, False, filter_names, mode=mode).start()
+            written = sum(export.result().values())
+            results[f"exportacao/{mode}"] = throughput(written, time.perf_counter() - start)
+    return results
+
+
+# Saída paralela concatenada == leitura sequencial, frame a frame
+def check_export(video_path, frames, filter_names, model_path=DEFAULT_MODEL, detect_interval=1):
+    equal, compared, mismatch = verify_parallel_export(video_path, export_segments(video_path, frames), filter_names,
+                                                       model_path=model_path, detect_interval=detect_interval)
+    return {'ok': equal, 'frames': compared, 'first_mismatch': mismatch}
+
+
+def bench_record(frames):
+    results = {}
+    height, width = frames[0].shape[:2]
+    for mode in ("video", "frames"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "gravacao.mp4" if mode == "video" else "frames")
+            # 'block': nenhum frame descartado, mede a vazão real do encoder/disco
+            recorder = AsyncRecorder(path, mode, size=(width, height), drop_policy='block').start()
+            start = time.perf_counter()
+            for frame in frames:
+                recorder.write(frame)
+            recorder.stop()
+            results[f"gravacao/{mode}/{width}x{height}"] = throughput(recorder.frames_written,
+                                                                       time.perf_counter() - start)
+    return results
+
+
+# Import de main.py em um processo novo (o que acontece antes de a janela abrir; o modelo
+# é carregado depois, em segundo plano). Tempos em ms
+STARTUP_SCRIPT = ("import time; start = time.perf_counter(); import main; "
+                  "print((time.perf_counter() - start) * 1000.0)")
+
+
+def bench_startup(repeat):
+    samples = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        if completed.returncode != 0:
+            lines = completed.stderr.strip().splitlines()
+            return {}, lines[-1] if lines else f"código {completed.returncode}"
+        samples.append(float(completed.stdout.strip().splitlines()[-1]))
+    p50, p95 = np.percentile(samples, (50, 95))
+    return {"inicializacao/import_main": {'median_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+                                          'min_ms': round(min(samples), 3), 'samples': repeat}}, None
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def machine_info():
+    commit, dirty = git_commit()
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+        'numpy': np.__version__,
+        'git_commit': commit,
+        'git_dirty': dirty,
+    }
+
+
+def run_benchmark(suites=SUITES, repeat=20, image_path=None, video_path=None, model_path=DEFAULT_MODEL,
+                  export_frames=120, record_frames=120):
+    image_path = image_path or first_file(IMAGES_DIR, ('.png', '.jpg', '.jpeg', '.bmp'))
+    image = load_image(image_path)
+    video_path = video_path or first_file(VIDEOS_DIR, ('.mp4', '.avi', '.mov', '.mkv'))
+    report = {'machine': machine_info(),
+              'config': {'suites': list(suites), 'repeat': repeat, 'image': image_path, 'video': video_path,
+                         'image_size': list(image.shape[1::-1]), 'model': model_path},
+              'results': {}, 'checks': {}, 'skipped': {}}
+    results = report['results']
+    for suite in suites:
+        print(f"Executando: {suite}")
+        if suite == 'filters':
+            results.update(bench_filters(image, repeat))
+        elif suite == 'display':
+            results.update(bench_display(image, repeat))
+        elif suite == 'detection':
+            detection_results, reason = bench_detection(image, max(1, repeat // 2), model_path)
+            results.update(detection_results)
+            if reason:
+                report['skipped'][suite] = reason
+        elif suite == 'decode':
+            for frame_step in (1, 4):
+                results[f"decodificacao/passo{frame_step}"] = bench_decode(video_path, frame_step)
+        elif suite == 'export':
+            results.update(bench_export(video_path, export_frames, ['blur', 'canny']))
+            report['checks']["exportacao/paralelo=sequencial"] = check_export(video_path, export_frames,
+                                                                             ['blur', 'canny'])
+            # Com rastreamento entre detecções, o estado do detector não pode atravessar os cortes
+            try:
+                report['checks']["exportacao/paralelo=sequencial/deteccao_a_cada_3"] = check_export(
+                    video_path, export_frames, [DETECT_FILTER], model_path, detect_interval=3)
+            except Exception as e:
+                report['skipped']["export/deteccao"] = f"{type(e).__name__}: {e}"
+        elif suite == 'record':
+            results.update(bench_record(read_frames(video_path, record_frames)))
+        elif suite == 'startup':
+            startup_results, reason = bench_startup(max(1, repeat // 4))
+            results.update(startup_results)
+            if reason:
+                report['skipped'][suite] = reason
+    return report
+
+
+# Compara com um relatório anterior: tempos maiores ou vazões menores que o limiar são regressões
+def compare_reports(old, new, threshold=REGRESSION_THRESHOLD):
+    rows = []
+    for name, result in new['results'].items():
+        previous = old.get('results', {}).get(name)
+        if previous is None:
+            continue
+        if 'median_ms' in result and 'median_ms' in previous:
+            before, after = previous['median_ms'], result['median_ms']
+            change = (after - before) / before if before else 0.0
+        elif 'fps' in result and 'fps' in previous:
+            before, after = previous['fps'], result['fps']
+            change = (before - after) / before if before else 0.0
+        else:
+            continue
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def print_results(report):
+    for name, result in report['results'].items():
+        if 'median_ms' in result:
+            print(f"{name:<36} p50 {result['median_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms")
+        else:
+            print(f"{name:<36} {result['fps']:9.1f} frames/s")
+    for name, check in report['checks'].items():
+        status = "ok" if check['ok'] else f"FALHOU no frame {check['first_mismatch']}"
+        print(f"{name:<36} {status} ({check['frames']} frames)")
+    for suite, reason in report['skipped'].items():
+        print(f"{suite:<36} ignorado ({reason})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos filtros, exibição, detecção, decodificação, "
+                                                 "exportação, gravação e inicialização (sem interface).")
+    parser.add_argument("--output", default=None,
+                        help="JSON de saída (padrão: benchmark_<data>.json na pasta atual)")
+    parser.add_argument("--only", default=",".join(SUITES),
+                        help=f"Suítes separadas por vírgulas. Opções: {', '.join(SUITES)}")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetições por medida de tempo")
+    parser.add_argument("--image", default=None, help=f"Imagem de entrada (padrão: a primeira de {IMAGES_DIR}/)")
+    parser.add_argument("--video", default=None, help=f"Vídeo de entrada (padrão: o primeiro de {VIDEOS_DIR}/)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Pesos do YOLO para a detecção")
+    parser.add_argument("--export-frames", type=int, default=120, help="Frames exportados (em 4 segmentos)")
+    parser.add_argument("--record-frames", type=int, default=120, help="Frames gravados")
+    parser.add_argument("--compare", default=None, help="JSON anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Piora relativa considerada regressão (0.10 = 10%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    suites = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = [name for name in suites if name not in SUITES]
+    if unknown:
+        print(f"Erro: suítes desconhecidas: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    try:
+        report = run_benchmark(suites, max(1, args.repeat), args.image, args.video, args.model,
+                               args.export_frames, args.record_frames)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 2
+
+    print_results(report)
+    output = args.output or time.strftime("benchmark_%Y-%m-%d_%H-%M-%S.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados salvos em {output}")
+    failed_checks = [name for name, check in report['checks'].items() if not check['ok']]
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = 0
+        # Variação positiva = pior (mais tempo ou menos frames/s)
+        for name, before, after, change, regressed in compare_reports(old, report, args.threshold):
+            regressions += regressed
+            print(f"{'REGRESSÃO ' if regressed else ''}{name}: {before} -> {after} ({change:+.1%})")
+        print(f"{regressions} regressão(ões) acima de {args.threshold:.0%} em relação a {args.compare}")
+        return 1 if regressions or failed_checks else 0
+    return 1 if failed_checks else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
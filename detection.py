@@ -0,0 +1,381 @@
+import cv2
+import numpy as np
+from filters import DEFAULT_MODEL
+# Detecção de objetos (YOLOv8) usada pelo filtro 'detect_objects'.
+# O ultralytics é importado apenas quando um modelo é realmente carregado.
+
+
+# Caixas (xyxy, coordenadas do frame), classes e confianças de um frame
+class Detections:
+    def __init__(self, boxes, classes, scores):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.classes = np.asarray(classes, dtype=np.int32).reshape(-1)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def from_result(cls, result):
+        boxes = result.boxes
+        return cls(boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(), boxes.conf.cpu().numpy())
+
+    # Mantém as detecções marcadas em "keep" (opcionalmente com caixas já atualizadas)
+    def subset(self, keep, boxes=None):
+        boxes = self.boxes[keep] if boxes is None else boxes
+        return Detections(boxes, self.classes[keep], self.scores[keep])
+
+
+# Desenha as caixas no mesmo estilo de results[0].plot()
+def draw_detections(frame, detections, names):
+    from ultralytics.utils.plotting import Annotator, colors
+    annotator = Annotator(frame.copy(), example=str(names))
+    for box, cls, score in zip(detections.boxes, detections.classes, detections.scores):
+        annotator.box_label(box, f"{names[int(cls)]} {score:.2f}", color=colors(int(cls), True))
+    return annotator.result()
+
+
+# Detecção em todos os frames (comportamento original do filtro).
+# Com um cache (detection_cache.DetectionCache) e o índice do frame atual definido por quem
+# lê o vídeo (frame_index), as detecções já feitas são reaproveitadas. "source" identifica
+# os filtros aplicados antes da detecção (ver FilterPipeline); a resolução do frame também
+# faz parte da chave, pois as caixas estão em coordenadas do frame (pré-visualização reduzida).
+class Detector:
+    def __init__(self, model, conf=0.5):
+        self.model = model
+        self.conf = conf
+        self.cache = None
+        self.frame_index = None  # None: frame fora de um vídeo (webcam, imagem), sem cache
+        self.motion_gate = None  # MotionGate opcional: sem movimento, reaproveita a última detecção
+        self.last_detections = None
+        self.detections_run = 0
+        self.cache_hits = 0
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def detect(self, frame):
+        self.detections_run += 1
+        return Detections.from_result(self.model(frame, conf=self.conf, verbose=False)[0])
+
+    @staticmethod
+    def _cache_source(source, frame):
+        height, width = frame.shape[:2]
+        return f"{source}@{width}x{height}"
+
+    # Detecções do cache para o frame, ou None
+    def cached(self, source, frame, frame_index):
+        if self.cache is None or frame_index is None:
+            return None
+        detections = self.cache.get(self._cache_source(source, frame), frame_index)
+        if detections is not None:
+            self.cache_hits += 1
+        return detections
+
+    def store(self, source, frame, frame_index, detections):
+        if self.cache is not None and frame_index is not None:
+            self.cache.put(self._cache_source(source, frame), frame_index, detections)
+
+    # As detecções reaproveitadas pela porta de movimento não vão para o cache
+    def detections_for(self, frame, source=""):
+        detections = self.cached(source, frame, self.frame_index)
+        if detections is None:
+            if self.motion_unchanged(frame):
+                return self.last_detections
+            detections = self.detect(frame)
+            self.store(source, frame, self.frame_index, detections)
+        self.remember(frame, detections)
+        return detections
+
+    # Há detecções anteriores e a porta de movimento diz que o frame não mudou desde elas
+    def motion_unchanged(self, frame):
+        return self.motion_gate is not None and self.last_detections is not None and \
+            not self.motion_gate.changed(frame)
+
+    def remember(self, frame, detections):
+        self.last_detections = detections
+        if self.motion_gate is not None:
+            self.motion_gate.set_reference(frame)
+
+    # Frame anotado
+    def __call__(self, frame, source=""):
+        return draw_detections(frame, self.detections_for(frame, source), self.names)
+
+    # Vários frames em uma única inferência (exportação, sem restrição de latência)
+    def detect_batch(self, frames):
+        self.detections_run += len(frames)
+        return [Detections.from_result(result) for result in self.model(list(frames), conf=self.conf, verbose=False)]
+
+    # Frames consecutivos a partir de frame_index; só os que não estão no cache vão ao modelo
+    def annotate_batch(self, frames, source=""):
+        if self.motion_gate is not None:
+            return self._annotate_in_order(frames, source)
+        indices = [None if self.frame_index is None else self.frame_index + i for i in range(len(frames))]
+        detections = [self.cached(source, frame, index) for frame, index in zip(frames, indices)]
+        missing = [i for i, item in enumerate(detections) if item is None]
+        if missing:
+            for i, item in zip(missing, self.detect_batch([frames[i] for i in missing])):
+                detections[i] = item
+                self.store(source, frames[i], indices[i], item)
+        return [draw_detections(frame, item, self.names) for frame, item in zip(frames, detections)]
+
+    # Com a porta de movimento (ou o rastreamento), cada frame depende do anterior
+    def _annotate_in_order(self, frames, source=""):
+        first_index = self.frame_index
+        annotated = []
+        for i, frame in enumerate(frames):
+            if first_index is not None:
+                self.frame_index = first_index + i
+            annotated.append(self(frame, source))
+        self.frame_index = first_index
+        return annotated
+
+    # Chamado em descontinuidades (seek, troca de vídeo)
+    def reset(self):
+        self.last_detections = None
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+
+    def stats(self):
+        stats = {
+            'detections_run': self.detections_run,
+            'cache_hits': self.cache_hits,
+        }
+        if self.motion_gate is not None:
+            stats.update(self.motion_gate.stats())
+        return stats
+
+
+# Porta de movimento barata antes da inferência: o frame é reduzido (largura "width"), em
+# tons de cinza e suavizado, e comparado com o frame da última detecção. Muda se a fração
+# de pixels com diferença acima de pixel_threshold passar de threshold. Comparar com a
+# última detecção (e não com o frame anterior) pega também mudanças lentas. Depois de
+# max_skipped frames seguidos sem inferência, uma detecção é feita de qualquer forma.
+class MotionGate:
+    def __init__(self, threshold=0.01, pixel_threshold=25, width=160, max_skipped=150):
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.max_skipped = max_skipped
+        self.reference = None
+        self.last_frame = None   # último frame avaliado e a sua versão reduzida
+        self.last_small = None
+        self.last_score = 0.0
+        self.skipped_in_row = 0
+
+        # Contadores
+        self.frames_checked = 0
+        self.frames_skipped = 0
+
+    def _small(self, frame):
+        if frame is self.last_frame:
+            return self.last_small
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.width / width)
+        small = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        self.last_frame, self.last_small = frame, small
+        return small
+
+    # Fração de pixels que mudaram desde a referência (1.0 sem referência)
+    def score(self, frame):
+        small = self._small(frame)
+        if self.reference is None or self.reference.shape != small.shape:
+            return 1.0
+        diff = cv2.absdiff(small, self.reference)
+        return cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]) / diff.size
+
+    def changed(self, frame):
+        self.frames_checked += 1
+        self.last_score = self.score(frame)
+        if self.last_score >= self.threshold or self.skipped_in_row >= self.max_skipped:
+            return True
+        self.skipped_in_row += 1
+        self.frames_skipped += 1
+        return False
+
+    def set_reference(self, frame):
+        self.reference = self._small(frame)
+        self.skipped_in_row = 0
+
+    def reset(self):
+        self.reference = None
+        self.last_frame = self.last_small = None
+        self.skipped_in_row = 0
+
+    # Fração dos frames avaliados em que a inferência foi evitada
+    def skip_ratio(self):
+        return self.frames_skipped / self.frames_checked if self.frames_checked else 0.0
+
+    def stats(self):
+        return {
+            'motion_checked': self.frames_checked,
+            'motion_skipped': self.frames_skipped,
+            'motion_skip_ratio': round(self.skip_ratio(), 3),
+            'motion_score': round(self.last_score, 4),
+        }
+
+
+# Rastreador leve de caixas por fluxo óptico (Lucas-Kanade) entre frames consecutivos.
+# Cada caixa é deslocada pela mediana do movimento dos seus pontos e escalada pela
+# mediana da variação das distâncias ao centro.
+class BoxTracker:
+    def __init__(self, max_side=640, points_per_box=25, max_fb_error=1.0):
+        self.max_side = max_side
+        self.points_per_box = points_per_box
+        self.max_fb_error = max_fb_error
+        self.prev_gray = None
+        self.points = []
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.scale = 1.0
+
+    def _gray(self, frame):
+        height, width = frame.shape[:2]
+        self.scale = min(1.0, self.max_side / max(height, width))
+        if self.scale < 1.0:
+            frame = cv2.resize(frame, (int(width * self.scale), int(height * self.scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def start(self, frame, boxes):
+        gray = self._gray(frame)
+        self.prev_gray = gray
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4).copy()
+        self.points = []
+        for box in self.boxes * self.scale:
+            x1, y1, x2, y2 = [int(round(v)) for v in box]
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(gray.shape[1], x2), min(gray.shape[0], y2)
+            points = None
+            if x2 - x1 > 2 and y2 - y1 > 2:
+                mask = np.zeros_like(gray)
+                mask[y1:y2, x1:x2] = 255
+                points = cv2.goodFeaturesToTrack(gray, self.points_per_box, 0.01, 3, mask=mask)
+            if points is None or len(points) < 3:
+                # Região sem cantos: usar uma grade 3x3 dentro da caixa
+                xs, ys = np.meshgrid(np.linspace(x1, x2, 5)[1:4], np.linspace(y1, y2, 5)[1:4])
+                points = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+            self.points.append(points.astype(np.float32))
+
+    # Devolve (caixas atualizadas, máscara das caixas mantidas, confiança do rastreamento)
+    def update(self, frame):
+        gray = self._gray(frame)
+        if not self.points:
+            self.prev_gray = gray
+            return self.boxes, np.ones(0, dtype=bool), 1.0
+
+        all_points = np.concatenate(self.points)
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, all_points, None,
+                                                          winSize=(15, 15), maxLevel=2)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, next_points, None,
+                                                               winSize=(15, 15), maxLevel=2)
+        fb_error = np.linalg.norm((all_points - back_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+        keep = np.zeros(len(self.points), dtype=bool)
+        new_points = []
+        start = 0
+        for i, points in enumerate(self.points):
+            end = start + len(points)
+            box_good = good[start:end]
+            if box_good.sum() >= 3:
+                old = points[box_good].reshape(-1, 2)
+                new = next_points[start:end][box_good].reshape(-1, 2)
+                shift = np.median(new - old, axis=0) / self.scale
+                old_spread = np.linalg.norm(old - old.mean(axis=0), axis=1)
+                new_spread = np.linalg.norm(new - new.mean(axis=0), axis=1)
+                valid = old_spread > 1e-3
+                growth = float(np.clip(np.median(new_spread[valid] / old_spread[valid]), 0.8, 1.25)) if valid.any() else 1.0
+
+                x1, y1, x2, y2 = self.boxes[i]
+                cx, cy = (x1 + x2) / 2 + shift[0], (y1 + y2) / 2 + shift[1]
+                half_w, half_h = (x2 - x1) / 2 * growth, (y2 - y1) / 2 * growth
+                self.boxes[i] = (cx - half_w, cy - half_h, cx + half_w, cy + half_h)
+                new_points.append(new.reshape(-1, 1, 2))
+                keep[i] = True
+            start = end
+
+        self.points = new_points
+        self.boxes = self.boxes[keep]
+        self.prev_gray = gray
+        return self.boxes.copy(), keep, float(good.mean())
+
+
+# Detecção a cada "interval" frames; nos intermediários as caixas são levadas adiante pelo
+# rastreador. Uma nova detecção é feita antes do prazo se a confiança do rastreamento cair
+# abaixo de min_track_confidence. Com interval=1 equivale a Detector.
+class IntervalDetector(Detector):
+    def __init__(self, model, interval=5, min_track_confidence=0.5, conf=0.5):
+        super().__init__(model, conf)
+        self.interval = max(1, int(interval))
+        self.min_track_confidence = min_track_confidence
+        self.tracker = BoxTracker()
+        self.detections = None
+        self.frames_since_detection = 0
+        self.frames_tracked = 0
+
+    def reset(self):
+        super().reset()
+        self.detections = None
+        self.frames_since_detection = 0
+
+    # Só as detecções reais vão para o cache; um frame já detectado em uma passagem
+    # anterior é usado diretamente e reinicia o rastreamento
+    def __call__(self, frame, source=""):
+        detections = self.cached(source, frame, self.frame_index)
+        if detections is None:
+            if self.interval > 1 and self.detections is not None and self.frames_since_detection < self.interval:
+                boxes, keep, confidence = self.tracker.update(frame)
+                if confidence >= self.min_track_confidence:
+                    self.detections = self.detections.subset(keep, boxes)
+                    # A porta de movimento reaproveita as caixas já rastreadas, não as da inferência
+                    self.last_detections = self.detections
+                    self.frames_since_detection += 1
+                    self.frames_tracked += 1
+                    return draw_detections(frame, self.detections, self.names)
+            # Sem movimento desde a última detecção: as caixas em tela, sem inferência
+            if self.motion_unchanged(frame):
+                return draw_detections(frame, self.detections, self.names)
+            detections = self.detect(frame)
+            self.store(source, frame, self.frame_index, detections)
+
+        self.remember(frame, detections)
+        self.detections = detections
+        self.frames_since_detection = 1
+        if self.interval > 1:
+            self.tracker.start(frame, self.detections.boxes)
+        return draw_detections(frame, self.detections, self.names)
+
+    # O rastreamento depende do frame anterior: os frames do lote são processados em ordem
+    def annotate_batch(self, frames, source=""):
+        if self.interval == 1:
+            return super().annotate_batch(frames, source)
+        return self._annotate_in_order(frames, source)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({'interval': self.interval, 'frames_tracked': self.frames_tracked})
+        return stats
+
+
+# O ultralytics (e o torch) só é importado aqui, na primeira carga de um modelo.
+# model_path: pesos .pt ou exportados (.onnx, pasta OpenVINO; ver detection_backends)
+def load_model(model_path=DEFAULT_MODEL):
+    from ultralytics import YOLO
+    return YOLO(model_path, task="detect")
+
+
+# Carrega o YOLO e devolve o detector (para processos sem interface).
+# motion_threshold: liga a porta de movimento (ver MotionGate); None desliga
+def load_detector(model_path=DEFAULT_MODEL, detect_interval=1, conf=0.5, motion_threshold=None):
+    model = load_model(model_path)
+    if detect_interval > 1:
+        detector = IntervalDetector(model, interval=detect_interval, conf=conf)
+    else:
+        detector = Detector(model, conf=conf)
+    if motion_threshold is not None:
+        detector.motion_gate = MotionGate(threshold=motion_threshold)
+    return detector
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import cv2
+import numpy as np
+from filters import DEFAULT_MODEL
+# Backends de inferência na CPU para o YOLOv8.
+# Os pesos .pt são exportados uma única vez para ONNX (ONNX Runtime) ou OpenVINO IR, ao lado
+# do arquivo original, opcionalmente quantizados em INT8 com uma pasta local de imagens de
+# calibração. O modelo exportado é carregado pelo próprio ultralytics (YOLO(caminho)), que
+# escolhe o runtime pelo formato: caixas, classes e confianças saem no mesmo formato.
+#
+# Dependências opcionais: onnx + onnxruntime (backend "onnx"), openvino (backend
+# "openvino") e nncf (OpenVINO INT8).
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+IMAGE_SIZE = 640
+CALIBRATION_DIR = "images"
+CALIBRATION_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+MAX_CALIBRATION_IMAGES = 300
+
+
+# Caminho dos pesos prontos para o backend, exportando/quantizando na primeira vez
+def resolve_model(model_path=DEFAULT_MODEL, backend='pytorch', int8=False, calibration_dir=CALIBRATION_DIR):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de detecção desconhecido: {backend}")
+    if backend == 'pytorch':
+        if int8:
+            raise ValueError("Quantização INT8 disponível apenas nos backends onnx e openvino.")
+        return model_path
+
+    stem = os.path.splitext(model_path)[0]
+    if backend == 'onnx':
+        onnx_path = stem + ".onnx"
+        if not os.path.exists(onnx_path):
+            onnx_path = _export(model_path, 'onnx')
+        if not int8:
+            return onnx_path
+        int8_path = stem + "_int8.onnx"
+        if not os.path.exists(int8_path):
+            quantize_onnx(onnx_path, int8_path, calibration_dir)
+        return int8_path
+
+    openvino_dir = stem + ("_int8" if int8 else "") + "_openvino_model"
+    if os.path.isdir(openvino_dir):
+        return openvino_dir
+    if not int8:
+        return _export(model_path, 'openvino')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data = _calibration_dataset(model_path, calibration_dir, tmp_dir)
+        return _export(model_path, 'openvino', int8=True, data=data)
+
+
+def _export(model_path, export_format, **kwargs):
+    from ultralytics import YOLO
+    path = YOLO(model_path).export(format=export_format, imgsz=IMAGE_SIZE, verbose=False, **kwargs)
+    return str(path).rstrip("/\\")
+
+
+def calibration_images(calibration_dir=CALIBRATION_DIR):
+    if not os.path.isdir(calibration_dir):
+        raise ValueError(f"Pasta de calibração não encontrada: {calibration_dir}")
+    images = [os.path.join(calibration_dir, name) for name in sorted(os.listdir(calibration_dir))
+              if name.lower().endswith(CALIBRATION_EXTENSIONS)]
+    if not images:
+        raise ValueError(f"Nenhuma imagem de calibração em {calibration_dir}")
+    return images[:MAX_CALIBRATION_IMAGES]
+
+
+# Mesmo pré-processamento do ultralytics: letterbox com borda 114, RGB, NCHW em [0, 1]
+def letterbox_blob(frame, size=IMAGE_SIZE):
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - new_height) // 2, (size - new_width) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + new_height, left:left + new_width] = resized
+    blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[np.newaxis]
+    return np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+
+# Quantização estática do ONNX Runtime. Só as convoluções são quantizadas: a cabeça de
+# detecção (concatenação, DFL, decodificação das caixas) continua em float.
+def quantize_onnx(onnx_path, int8_path, calibration_dir=CALIBRATION_DIR):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime
+
+    session = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    size = model_input.shape[-1] if isinstance(model_input.shape[-1], int) else IMAGE_SIZE
+    paths = iter(calibration_images(calibration_dir))
+
+    class ImageReader(CalibrationDataReader):
+        def get_next(self):
+            for path in paths:
+                frame = cv2.imread(path)
+                if frame is not None:
+                    return {model_input.name: letterbox_blob(frame, size)}
+            return None
+
+    quantize_static(onnx_path, int8_path, ImageReader(), quant_format=QuantFormat.QDQ,
+                    op_types_to_quantize=['Conv'], per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+# O calibrador INT8 do OpenVINO (via ultralytics) lê um dataset YAML: um YAML temporário
+# apontando para a pasta local de imagens (os rótulos não são usados na calibração)
+def _calibration_dataset(model_path, calibration_dir, tmp_dir):
+    from ultralytics import YOLO
+    calibration_images(calibration_dir)
+    names = YOLO(model_path).names
+    data_path = os.path.join(tmp_dir, "calibration.yaml")
+    with open(data_path, "w", encoding="utf-8") as f:
+        image_dir = os.path.abspath(calibration_dir)
+        f.write(f"path: {image_dir}\ntrain: {image_dir}\nval: {image_dir}\nnames:\n")
+        for index in sorted(names):
+            f.write(f"  {index}: {names[index]}\n")
+    return data_path
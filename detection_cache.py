@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+from detection import Detections
+# Cache em disco das detecções de cada frame de um vídeo (caixas, classes, confianças).
+# Um arquivo por vídeo + pesos do modelo + conf; dentro dele, cada entrada é identificada
+# pelo frame e por "source": os filtros aplicados antes da detecção e a resolução do frame,
+# que mudam o resultado.
+# Replays e reexportações redesenham as caixas a partir do cache, sem rodar o modelo.
+
+CACHE_VERSION = 2
+DETECTION_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "processador_imagens", "detections")
+LOCK_STALE_SECONDS = 60.0  # lock mais antigo que isso: de um processo que terminou sem liberá-lo
+
+
+# Lock entre processos por arquivo (criação exclusiva funciona em Windows e Linux): os
+# processos da exportação paralela gravam o mesmo cache
+class FileLock:
+    def __init__(self, path, poll=0.05):
+        self.path = path
+        self.poll = poll
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE_SECONDS:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(self.poll)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class DetectionCache:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}   # (source, frame) -> Detections
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, source, frame_index):
+        with self.lock:
+            return self.entries.get((source, int(frame_index)))
+
+    def put(self, source, frame_index, detections):
+        with self.lock:
+            self.entries[(source, int(frame_index))] = detections
+            self.dirty = True
+
+    @classmethod
+    def open(cls, filename, model_path, conf, cache_dir=DETECTION_CACHE_DIR):
+        cache = cls(detection_cache_path(filename, model_path, conf, cache_dir))
+        if os.path.exists(cache.path):
+            try:
+                cache.entries = cls._read(cache.path)
+            except Exception as e:
+                print(f"Cache de detecções inválido, ignorando: {e}")
+        return cache
+
+    # Grava as entradas novas. Outro processo (exportação paralela) pode ter gravado o mesmo
+    # arquivo: com o lock do arquivo, as entradas em disco são lidas e mescladas antes de
+    # substituí-lo, sem que outro processo o substitua no meio do caminho.
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with FileLock(self.path + ".lock"):
+                if os.path.exists(self.path):
+                    try:
+                        on_disk = self._read(self.path)
+                        on_disk.update(entries)
+                        entries = on_disk
+                    except Exception:
+                        pass
+                self._write(self.path, entries)
+        except OSError as e:
+            print(f"Não foi possível salvar o cache de detecções: {e}")
+
+    # Formato compacto: as caixas de todos os frames concatenadas, com o número de caixas
+    # de cada entrada
+    @staticmethod
+    def _write(path, entries):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sources = sorted({source for source, _ in entries})
+        source_ids = {source: i for i, source in enumerate(sources)}
+        keys = sorted(entries, key=lambda key: (source_ids[key[0]], key[1]))
+        items = [entries[key] for key in keys]
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path, version=CACHE_VERSION,
+            sources=np.asarray(sources, dtype=str),
+            entry_source=np.asarray([source_ids[source] for source, _ in keys], dtype=np.int32),
+            entry_frame=np.asarray([frame for _, frame in keys], dtype=np.int64),
+            entry_count=np.asarray([len(item) for item in items], dtype=np.int32),
+            boxes=np.concatenate([item.boxes for item in items]) if items else np.zeros((0, 4), np.float32),
+            classes=np.concatenate([item.classes for item in items]) if items else np.zeros(0, np.int32),
+            scores=np.concatenate([item.scores for item in items]) if items else np.zeros(0, np.float32))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path):
+        with np.load(path) as data:
+            if int(data['version']) != CACHE_VERSION:
+                return {}
+            sources = [str(source) for source in data['sources']]
+            boxes, classes, scores = data['boxes'], data['classes'], data['scores']
+            offsets = np.concatenate([[0], np.cumsum(data['entry_count'])])
+            entries = {}
+            for i, (source_id, frame) in enumerate(zip(data['entry_source'], data['entry_frame'])):
+                start, end = offsets[i], offsets[i + 1]
+                entries[(sources[source_id], int(frame))] = Detections(boxes[start:end], classes[start:end],
+                                                                       scores[start:end])
+            return entries
+
+
+# Identifica o vídeo (caminho, tamanho, data de modificação), os pesos do modelo e o conf
+def detection_cache_path(filename, model_path, conf, cache_dir=DETECTION_CACHE_DIR):
+    stat = os.stat(filename)
+    model_key = os.path.basename(model_path)
+    if os.path.exists(model_path):
+        model_stat = os.stat(model_path)
+        model_key = f"{os.path.abspath(model_path)}|{model_stat.st_size}|{model_stat.st_mtime_ns}"
+    key = f"{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}|{model_key}|{float(conf):.4f}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npz")
@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+# Preparação do frame para exibição (parte sem Tk de VideoImageProcessor.render_frame),
+# também usada pelo benchmark.
+
+
+# Tamanho exibido mantendo a proporção: (razão original/exibido, (largura, altura), deslocamento)
+def fit_to_canvas(frame_shape, canvas_width, canvas_height):
+    height, width = frame_shape[:2]
+    canvas_width, canvas_height = max(1, canvas_width), max(1, canvas_height)
+    ratio = max(width/canvas_width, height/canvas_height)
+    new_width = max(1, int(width / ratio))
+    new_height = max(1, int(height / ratio))
+    offset = ((canvas_width - new_width) / 2, (canvas_height - new_height) / 2)
+    return ratio, (new_width, new_height), offset
+
+
+# Redimensiona primeiro e converte BGR->RGB só o buffer reduzido, reaproveitando os dois
+# buffers enquanto o tamanho exibido não muda
+class DisplayBuffer:
+    def __init__(self):
+        self.resized = None
+        self.rgb = None
+
+    # Devolve (buffer RGB, True se os buffers foram realocados)
+    def convert(self, frame, size):
+        width, height = size
+        reallocated = self.rgb is None or self.rgb.shape[:2] != (height, width)
+        if reallocated:
+            self.resized = np.empty((height, width, 3), dtype=np.uint8)
+            self.rgb = np.empty((height, width, 3), dtype=np.uint8)
+        cv2.resize(frame, (width, height), dst=self.resized)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        return self.rgb, reallocated
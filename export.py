@@ -0,0 +1,318 @@
+import itertools
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from filters import DEFAULT_MODEL, DETECT_FILTER, compile_filter_chain
+from video_index import VideoIndex
+from video_io import seek_capture
+# Exportação de segmentos de vídeo (sem interface gráfica).
+# Dois modos, com o mesmo resultado da exportação sequencial:
+#  - "parallel": cada segmento é renderizado por um processo próprio, com sua própria
+#    captura e cadeia de filtros;
+#  - "single_pass": uma única leitura sequencial do vídeo, entregando cada frame ao
+#    writer do segmento a que pertence (sem seeks; o vídeo é decodificado uma vez).
+
+JPEG_QUALITY = 60
+# Frames por inferência do detector na exportação (o custo fixo de cada chamada ao modelo
+# é dividido pelo lote; sem detecção o lote não muda o resultado)
+DETECT_BATCH_SIZE = 8
+# No modo "auto", processos paralelos só a partir deste número de processos: com menos, o
+# ganho não compensa decodificar de novo o início de cada GOP e o seek de cada segmento
+AUTO_PARALLEL_MIN_WORKERS = 3
+
+
+# Recorte do zoom (mesma convenção de VideoImageProcessor.zoom_rect: x1, x2, y1, y2)
+def crop_zoom(frame, zoom_rect):
+    x1, x2, y1, y2 = zoom_rect
+    return frame[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)].copy()
+
+def is_zoomed(zoom_rect):
+    return any(zoom_rect)
+
+
+# Segmentos contíguos [início, fim) numerados a partir de 1, como em save_video_segments
+def segment_ranges(cutpoints, total_frames):
+    points = [0] + sorted(cutpoints) + [total_frames]
+    return [(i + 1, points[i], points[i + 1]) for i in range(len(points) - 1)]
+
+
+# Com o vídeo informado, as detecções são lidas/gravadas no cache de detecções
+def load_pipeline(filter_names, model_path=DEFAULT_MODEL, detect_interval=1, video_filename=None):
+    detector = None
+    if DETECT_FILTER in filter_names:
+        from detection import load_detector
+        detector = load_detector(model_path, detect_interval)
+        if video_filename is not None:
+            from detection_cache import DetectionCache
+            detector.cache = DetectionCache.open(video_filename, model_path, detector.conf)
+    return compile_filter_chain(filter_names, detector)
+
+
+def save_detection_cache(pipeline):
+    if pipeline.detector is not None and pipeline.detector.cache is not None:
+        pipeline.detector.cache.save()
+
+
+# Mesmo tratamento de apply_filters_on_video + apply_zoom_video
+def process_frame(frame, pipeline, zoom_rect):
+    try:
+        frame = pipeline(frame)
+    except Exception as e:
+        print(f"Erro ao aplicar filtros {pipeline.filter_names}: {e}")
+    if is_zoomed(zoom_rect):
+        frame = crop_zoom(frame, zoom_rect)
+    return frame
+
+
+# process_frame para um lote de frames consecutivos a partir de first_index; se o lote
+# falhar, repete frame a frame para manter o mesmo tratamento de erro
+def process_frames(frames, pipeline, zoom_rect, first_index=None):
+    pipeline.set_frame_index(first_index)
+    if len(frames) == 1:
+        return [process_frame(frames[0], pipeline, zoom_rect)]
+    try:
+        processed_frames = pipeline.process_batch(frames)
+    except Exception:
+        # O lote pode ter falhado no meio, com o rastreador já avançado: recomeçar com uma detecção nova
+        if pipeline.detector is not None:
+            pipeline.detector.reset()
+        processed_frames = []
+        for i, frame in enumerate(frames):
+            pipeline.set_frame_index(None if first_index is None else first_index + i)
+            processed_frames.append(process_frame(frame, pipeline, zoom_rect))
+        return processed_frames
+    if is_zoomed(zoom_rect):
+        processed_frames = [crop_zoom(frame, zoom_rect) for frame in processed_frames]
+    return processed_frames
+
+
+# Abre o destino de um segmento: pasta de frames JPEG ou arquivo .mp4
+class SegmentWriter:
+    def __init__(self, save_dir, segment_number, as_frames, fps, size):
+        self.as_frames = as_frames
+        self.frame_count = 0
+        if as_frames:
+            self.frames_dir = os.path.join(save_dir, f"segment_{segment_number}_frames")
+            os.makedirs(self.frames_dir, exist_ok=True)
+            self.out = None
+        else:
+            output_path = os.path.join(save_dir, f"segment_{segment_number}.mp4")
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            self.out = cv2.VideoWriter(output_path, fourcc, fps, size)
+
+    def write(self, frame):
+        if self.as_frames:
+            frame_path = os.path.join(self.frames_dir, f"frame_{self.frame_count:04d}.jpg")
+            cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        else:
+            self.out.write(frame)
+        self.frame_count += 1
+
+    def release(self):
+        if self.out is not None:
+            self.out.release()
+            self.out = None
+
+
+def video_properties(cap):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    return fps, (width, height)
+
+
+def open_capture(filename, threads=None):
+    if threads:
+        cv2.setNumThreads(threads)
+    cap = cv2.VideoCapture(filename)
+    if not cap.isOpened():
+        raise IOError(f"Não foi possível abrir o vídeo {filename}")
+    return cap
+
+
+# Lê "count" frames da posição atual do cap (o frame start_frame), processa em lotes de
+# batch_size e escreve no writer na ordem original. grabbed: o primeiro frame já foi lido
+# com grab() pelo seek (ver video_io.seek_capture)
+def write_frames(cap, writer, count, pipeline, zoom_rect, batch_size=1, start_frame=None, grabbed=False):
+    batch_size = max(1, int(batch_size))
+    remaining = count
+    while remaining > 0:
+        wanted = min(batch_size, remaining)
+        frames = []
+        for _ in range(wanted):
+            ret, frame = cap.retrieve() if grabbed else cap.read()
+            grabbed = False
+            if not ret:
+                break
+            frames.append(frame)
+        if frames:
+            first_index = None if start_frame is None else start_frame + count - remaining
+            for processed_frame in process_frames(frames, pipeline, zoom_rect, first_index):
+                writer.write(processed_frame)
+        if len(frames) < wanted:
+            return False
+        remaining -= wanted
+    return True
+
+
+# Renderiza um segmento [start_frame, end_frame) do vídeo. Roda no processo trabalhador.
+# O início do segmento é encontrado pelo índice do vídeo (index; lido do cache em disco
+# se não for passado), para cortar nos mesmos frames da leitura sequencial.
+def export_segment(filename, segment_number, start_frame, end_frame, save_dir, as_frames,
+                   filter_names=(), zoom_rect=(0, 0, 0, 0), model_path=DEFAULT_MODEL, threads=None,
+                   detect_interval=1, batch_size=DETECT_BATCH_SIZE, index=None):
+    index = index or VideoIndex.load_or_build(filename)
+    pipeline = load_pipeline(list(filter_names), model_path, detect_interval, filename)
+    cap = open_capture(filename, threads)
+    writer = SegmentWriter(save_dir, segment_number, as_frames, *video_properties(cap))
+    try:
+        grabbed = seek_capture(cap, start_frame, index)
+        if grabbed is not None:
+            write_frames(cap, writer, end_frame - start_frame, pipeline, zoom_rect, batch_size, start_frame,
+                         grabbed)
+    finally:
+        writer.release()
+        cap.release()
+        save_detection_cache(pipeline)
+    return {segment_number: writer.frame_count}
+
+
+# Renderiza todos os segmentos em uma única leitura sequencial do vídeo
+def export_segments_single_pass(filename, segments, save_dir, as_frames, filter_names=(),
+                                zoom_rect=(0, 0, 0, 0), model_path=DEFAULT_MODEL, threads=None,
+                                detect_interval=1, batch_size=DETECT_BATCH_SIZE, index=None):
+    pipeline = load_pipeline(list(filter_names), model_path, detect_interval, filename)
+    cap = open_capture(filename, threads)
+    fps, size = video_properties(cap)
+    frame_counts = {}
+    position = 0
+    try:
+        for segment_number, start_frame, end_frame in segments:
+            # Cada segmento começa com uma detecção nova, como no processo próprio do modo
+            # paralelo: o rastreamento não atravessa o corte
+            if pipeline.detector is not None:
+                pipeline.detector.reset()
+            # Segmentos contíguos (o caso de save_video_segments) nunca fazem seek
+            grabbed = False
+            if start_frame != position:
+                index = index or VideoIndex.load_or_build(filename)
+                grabbed = seek_capture(cap, start_frame, index)
+            writer = SegmentWriter(save_dir, segment_number, as_frames, fps, size)
+            try:
+                complete = grabbed is not None and write_frames(cap, writer, end_frame - start_frame, pipeline,
+                                                                zoom_rect, batch_size, start_frame, grabbed)
+            finally:
+                writer.release()
+            frame_counts[segment_number] = writer.frame_count
+            position = start_frame + writer.frame_count
+            if not complete:
+                position = -1
+    finally:
+        cap.release()
+        save_detection_cache(pipeline)
+    return frame_counts
+
+
+# Exportação em segundo plano, em processos separados. A interface consulta
+# done()/progress() periodicamente, sem bloquear.
+# mode: "parallel", "single_pass" ou "auto" (leitura única quando há menos de
+# AUTO_PARALLEL_MIN_WORKERS núcleos/segmentos para dividir o trabalho)
+class SegmentExport:
+    def __init__(self, filename, segments, save_dir, as_frames, filter_names=(),
+                 zoom_rect=(0, 0, 0, 0), model_path=DEFAULT_MODEL, workers=None, mode="auto",
+                 detect_interval=1, batch_size=DETECT_BATCH_SIZE, index=None):
+        self.filename = filename
+        self.index = index  # video_index.VideoIndex; construído em start() se não for passado
+        self.segments = segments
+        self.save_dir = save_dir
+        self.as_frames = as_frames
+        self.filter_names = list(filter_names)
+        self.zoom_rect = tuple(zoom_rect)
+        self.model_path = model_path
+        self.detect_interval = detect_interval
+        self.batch_size = batch_size
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(segments)))
+        if mode == "auto":
+            mode = "parallel" if self.workers >= AUTO_PARALLEL_MIN_WORKERS else "single_pass"
+        if mode == "single_pass":
+            self.workers = 1
+        self.mode = mode
+        self.executor = None
+        self.futures = []
+
+    def start(self):
+        # O índice é carregado uma vez aqui, em vez de em cada processo
+        if self.index is None and self.mode == "parallel":
+            self.index = VideoIndex.load_or_build(self.filename)
+        # "spawn": os processos não herdam a interface Tk nem as threads de leitura
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        # Dividir os núcleos entre os processos para não disputar threads do OpenCV
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        if self.mode == "single_pass":
+            self.futures = [
+                self.executor.submit(export_segments_single_pass, self.filename, self.segments, self.save_dir,
+                                     self.as_frames, self.filter_names, self.zoom_rect, self.model_path, threads,
+                                     self.detect_interval, self.batch_size, self.index)
+            ]
+        else:
+            self.futures = [
+                self.executor.submit(export_segment, self.filename, number, start, end, self.save_dir,
+                                     self.as_frames, self.filter_names, self.zoom_rect, self.model_path, threads,
+                                     self.detect_interval, self.batch_size, self.index)
+                for number, start, end in self.segments
+            ]
+        return self
+
+    def progress(self):
+        return sum(future.done() for future in self.futures), len(self.futures)
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    # Frames escritos por segmento; propaga o primeiro erro de um processo trabalhador
+    def result(self):
+        try:
+            frame_counts = {}
+            for future in self.futures:
+                frame_counts.update(future.result())
+            return frame_counts
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# Frames exportados como imagens, de todos os segmentos em ordem (a saída concatenada)
+def exported_frames(save_dir, segments):
+    for segment_number, _, _ in segments:
+        frames_dir = os.path.join(save_dir, f"segment_{segment_number}_frames")
+        for name in sorted(os.listdir(frames_dir)):
+            yield cv2.imread(os.path.join(frames_dir, name))
+
+
+# Exporta os segmentos em processos paralelos e em uma leitura sequencial (como frames) e
+# compara as duas saídas concatenadas, frame a frame.
+# Devolve (iguais, frames comparados, primeiro frame diferente ou None)
+def verify_parallel_export(filename, segments, filter_names=(), zoom_rect=(0, 0, 0, 0),
+                           model_path=DEFAULT_MODEL, workers=None, index=None, detect_interval=1,
+                           batch_size=DETECT_BATCH_SIZE):
+    index = index or VideoIndex.load_or_build(filename)
+    with tempfile.TemporaryDirectory() as sequential_dir, tempfile.TemporaryDirectory() as parallel_dir:
+        for save_dir, mode in ((sequential_dir, "single_pass"), (parallel_dir, "parallel")):
+            SegmentExport(filename, segments, save_dir, True, filter_names, zoom_rect, model_path,
+                          workers=workers, mode=mode, detect_interval=detect_interval,
+                          batch_size=batch_size, index=index).start().result()
+        compared = 0
+        for sequential, parallel in itertools.zip_longest(exported_frames(sequential_dir, segments),
+                                                          exported_frames(parallel_dir, segments)):
+            if sequential is None or parallel is None or sequential.shape != parallel.shape or \
+                    (sequential != parallel).any():
+                return False, compared, compared
+            compared += 1
+    return True, compared, None
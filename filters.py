@@ -0,0 +1,219 @@
+import functools
+import cv2
+import numpy as np
+# Filtros compartilhados entre a interface (main.py) e as ferramentas sem interface (batch.py).
+# Este módulo não pode importar tkinter/customtkinter: ele roda em processos sem display.
+
+
+def blur(frame):
+    return cv2.GaussianBlur(frame, (5,5), 0)
+
+def sharpen(frame):
+    kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
+    return cv2.filter2D(frame, -1, kernel)
+
+def emboss(frame):
+    kernel = np.array([[-2,-1,0], [-1,1,1], [0,1,2]])
+    return cv2.filter2D(frame, -1, kernel)
+
+def laplacian(frame):
+    return cv2.Laplacian(frame, cv2.CV_64F).astype(np.uint8)
+
+def canny(frame):
+    edges = cv2.Canny(frame, 100, 200)
+    return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+
+def sobel(frame):
+    grad_x = cv2.Sobel(frame, cv2.CV_64F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(frame, cv2.CV_64F, 0, 1, ksize=3)
+    abs_grad_x = cv2.convertScaleAbs(grad_x)
+    abs_grad_y = cv2.convertScaleAbs(grad_y)
+    return cv2.addWeighted(abs_grad_x, 0.5, abs_grad_y, 0.5, 0)
+
+def gray(frame):
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2BGR)
+
+def binary(frame):
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    _, binary_frame = cv2.threshold(gray_frame, 127, 255, cv2.THRESH_BINARY)
+    return cv2.cvtColor(binary_frame, cv2.COLOR_GRAY2BGR)
+
+
+# Nomes usados em VideoImageProcessor.video_filters
+FILTERS = {
+    'blur': blur,
+    'sharpen': sharpen,
+    'emboss': emboss,
+    'laplacian': laplacian,
+    'canny': canny,
+    'sobel': sobel,
+    'gray': gray,
+    'binary': binary,
+}
+
+DETECT_FILTER = 'detect_objects'
+DEFAULT_MODEL = "yolov8n.pt"
+FILTER_NAMES = list(FILTERS) + [DETECT_FILTER]
+
+
+# ----------- Pipeline compilado -------------
+# A cadeia de nomes é compilada uma única vez em uma lista de estágios. Os kernels são
+# pré-calculados e, depois de 'gray'/'binary'/'canny', o intermediário fica em 1 canal
+# (os três canais BGR seriam idênticos) até um estágio que exija cor ou o fim da cadeia.
+# O resultado é idêntico ao da aplicação filtro a filtro acima.
+SHARPEN_KERNEL = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]], dtype=np.float32)
+EMBOSS_KERNEL = np.array([[-2,-1,0], [-1,1,1], [0,1,2]], dtype=np.float32)
+
+def _fast_sharpen(frame):
+    return cv2.filter2D(frame, -1, SHARPEN_KERNEL)
+
+def _fast_emboss(frame):
+    return cv2.filter2D(frame, -1, EMBOSS_KERNEL)
+
+# CV_16S basta para kernels 3x3 sobre uint8 e evita os intermediários CV_64F
+def _fast_laplacian(frame):
+    return cv2.Laplacian(frame, cv2.CV_16S).astype(np.uint8)
+
+def _fast_sobel(frame):
+    abs_grad_x = cv2.convertScaleAbs(cv2.Sobel(frame, cv2.CV_16S, 1, 0, ksize=3))
+    abs_grad_y = cv2.convertScaleAbs(cv2.Sobel(frame, cv2.CV_16S, 0, 1, ksize=3))
+    return cv2.addWeighted(abs_grad_x, 0.5, abs_grad_y, 0.5, 0)
+
+def _to_gray(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+def _to_bgr(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+def _threshold(frame):
+    return cv2.threshold(frame, 127, 255, cv2.THRESH_BINARY)[1]
+
+# gray + threshold fundidos em um estágio
+def _gray_threshold(frame):
+    return _threshold(_to_gray(frame))
+
+def _fast_canny(frame):
+    return cv2.Canny(frame, 100, 200)
+
+# Filtros que preservam o número de canais (operam canal a canal)
+CHANNEL_PRESERVING = {
+    'blur': blur,
+    'sharpen': _fast_sharpen,
+    'emboss': _fast_emboss,
+    'laplacian': _fast_laplacian,
+    'sobel': _fast_sobel,
+}
+
+
+# detector: chamável (frame, source) -> frame anotado (ver detection.Detector), usado por
+# 'detect_objects'; "source" são os filtros aplicados antes da detecção
+class FilterPipeline:
+    def __init__(self, filter_names, detector=None):
+        validate_filter_chain(filter_names)
+        self.filter_names = list(filter_names)
+        self.detector = detector
+        self.profiler = None  # perf.PerfMonitor opcional: tempo de cada estágio
+        self.stages = self._compile(self.filter_names)
+
+    def _compile(self, filter_names):
+        stages = []
+        single_channel = False  # intermediário em tons de cinza (1 canal)
+        binary_valued = False   # intermediário só com 0/255
+
+        for position, filter_name in enumerate(filter_names):
+            if filter_name == 'gray':
+                # Em 1 canal, 'gray' não altera nada
+                if not single_channel:
+                    stages.append(('gray', _to_gray))
+                    single_channel = True
+
+            elif filter_name == 'binary':
+                # Limiarizar uma imagem já binária não altera nada
+                if not binary_valued:
+                    stages.append(('binary', _threshold if single_channel else _gray_threshold))
+                    single_channel = True
+                    binary_valued = True
+
+            elif filter_name == 'canny':
+                stages.append(('canny', _fast_canny))
+                single_channel = True
+                binary_valued = True
+
+            elif filter_name == DETECT_FILTER:
+                if single_channel:
+                    stages.append(('to_bgr', _to_bgr))
+                    single_channel = False
+                stages.append((DETECT_FILTER, functools.partial(self._detect, source='|'.join(filter_names[:position]))))
+                binary_valued = False
+
+            else:
+                stages.append((filter_name, CHANNEL_PRESERVING[filter_name]))
+                binary_valued = False
+
+        if single_channel:
+            stages.append(('to_bgr', _to_bgr))
+        return stages
+
+    def _detect(self, frame, source=""):
+        if self.detector is None:
+            raise ValueError("Modelo de detecção não carregado.")
+        return self.detector(frame, source)
+
+    # Índice no vídeo do próximo frame processado (cache de detecções); None fora de um vídeo
+    def set_frame_index(self, frame_index):
+        if self.detector is not None:
+            self.detector.frame_index = frame_index
+
+    def matches(self, filter_names, detector=None):
+        return self.filter_names == list(filter_names) and self.detector is detector
+
+    def __call__(self, frame):
+        if not self.stages:
+            return frame.copy()
+        if self.profiler is not None:
+            return self._profiled_call(frame)
+        processed_frame = frame
+        for _, stage in self.stages:
+            processed_frame = stage(processed_frame)
+        return processed_frame
+
+    def _profiled_call(self, frame):
+        processed_frame = frame
+        for name, stage in self.stages:
+            with self.profiler.measure(f"filtro: {name}" if name != DETECT_FILTER else "detecção"):
+                processed_frame = stage(processed_frame)
+        return processed_frame
+
+    # Mesmo resultado de [self(frame) for frame in frames], estágio por estágio, para que a
+    # detecção rode uma vez por lote (detector.annotate_batch) em vez de uma vez por frame
+    def process_batch(self, frames):
+        if not self.stages:
+            return [frame.copy() for frame in frames]
+        processed_frames = list(frames)
+        for name, stage in self.stages:
+            if name == DETECT_FILTER:
+                processed_frames = self._detect_batch(processed_frames, **stage.keywords)
+            else:
+                processed_frames = [stage(frame) for frame in processed_frames]
+        return processed_frames
+
+    def _detect_batch(self, frames, source=""):
+        if self.detector is None:
+            raise ValueError("Modelo de detecção não carregado.")
+        return self.detector.annotate_batch(frames, source)
+
+
+def compile_filter_chain(filter_names, detector=None):
+    return FilterPipeline(filter_names, detector)
+
+
+# Aplica a cadeia de filtros na ordem dada (mesma semântica de apply_filters_on_video)
+def apply_filter_chain(frame, filter_names, detector=None):
+    return compile_filter_chain(filter_names, detector)(frame)
+
+
+def validate_filter_chain(filter_names):
+    unknown = [name for name in filter_names if name not in FILTER_NAMES]
+    if unknown:
+        raise ValueError(f"Filtro(s) desconhecido(s): {', '.join(unknown)}")
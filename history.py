@@ -0,0 +1,162 @@
+import cv2
+import numpy as np
+# Histórico do modo "Cascata" no modo imagem: a imagem base e a lista de etapas aplicadas,
+# cada uma com o seu resultado intermediário. Desfazer/refazer só muda a posição no
+# histórico; remover ou trocar uma etapa recalcula a partir dela, reaproveitando as
+# anteriores.
+# Os intermediários ocupam no máximo budget_bytes: os mais distantes da posição atual são
+# comprimidos (PNG, sem perdas) e, se ainda faltar espaço, descartados; um intermediário
+# descartado é recalculado a partir do anterior quando volta a ser necessário.
+# Não importa tkinter: pode ser usado sem display.
+
+
+# Etapa: (nome, função frame -> frame), como os estágios de filters.FilterPipeline
+class _Step:
+    def __init__(self, name, stage):
+        self.name = name
+        self.stage = stage
+        self.frame = None       # resultado em memória
+        self.compressed = None  # resultado comprimido (PNG)
+
+    @property
+    def size_bytes(self):
+        if self.frame is not None:
+            return self.frame.nbytes
+        return len(self.compressed) if self.compressed is not None else 0
+
+    def discard(self):
+        self.frame = None
+        self.compressed = None
+
+
+class ImageHistory:
+    def __init__(self, base=None, budget_bytes=512 * 1024 * 1024, png_compression=1):
+        self.budget_bytes = budget_bytes
+        self.png_compression = png_compression
+        self.base = None
+        self.steps = []     # etapas aplicadas e, depois de "position", as que podem ser refeitas
+        self.position = 0   # número de etapas ativas
+
+        # Contadores
+        self.recomputed = 0
+        self.compressions = 0
+        self.decompressions = 0
+        self.reset(base)
+
+    def reset(self, base):
+        self.base = base
+        self.steps = []
+        self.position = 0
+
+    def current(self):
+        return self._result(self.position)
+
+    # Nomes das etapas ativas, em ordem
+    def step_names(self):
+        return [step.name for step in self.steps[:self.position]]
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.steps)
+
+    # Nova etapa sobre o resultado atual; descarta as etapas desfeitas
+    def apply(self, name, stage):
+        self.truncate(self.position)
+        self.steps.append(_Step(name, stage))
+        self.position += 1
+        return self.current()
+
+    def undo(self):
+        return self.seek(self.position - 1)
+
+    def redo(self):
+        return self.seek(self.position + 1)
+
+    # Vai para depois da etapa "position" (0: imagem base), mantendo as etapas para refazer
+    def seek(self, position):
+        self.position = min(max(0, position), len(self.steps))
+        return self.current()
+
+    # Mantém só as primeiras "count" etapas
+    def truncate(self, count):
+        del self.steps[count:]
+        self.position = min(self.position, count)
+
+    def remove(self, index):
+        del self.steps[index]
+        if index < self.position:
+            self.position -= 1
+        self._invalidate(index)
+        return self.current()
+
+    def replace(self, index, name, stage):
+        self.steps[index] = _Step(name, stage)
+        self._invalidate(index + 1)
+        return self.current()
+
+    def stats(self):
+        return {
+            'steps': len(self.steps),
+            'position': self.position,
+            'in_memory': sum(step.frame is not None for step in self.steps),
+            'compressed': sum(step.compressed is not None for step in self.steps),
+            'size_bytes': sum(step.size_bytes for step in self.steps),
+            'budget_bytes': self.budget_bytes,
+            'recomputed': self.recomputed,
+            'compressions': self.compressions,
+            'decompressions': self.decompressions,
+        }
+
+    # Os resultados a partir de "index" dependem de uma etapa que mudou
+    def _invalidate(self, index):
+        for step in self.steps[index:]:
+            step.discard()
+
+    # Resultado depois de "count" etapas; calcula só a partir do último intermediário disponível
+    def _result(self, count):
+        if count == 0:
+            return self.base
+        start = count
+        while start > 0 and self.steps[start - 1].frame is None and self.steps[start - 1].compressed is None:
+            start -= 1
+        frame = self.base
+        if start > 0:
+            frame = self._load(self.steps[start - 1])
+        for step in self.steps[start:count]:
+            step.frame = frame = step.stage(frame)
+            self.recomputed += 1
+        self._enforce_budget(count)
+        return frame
+
+    def _load(self, step):
+        if step.frame is None:
+            step.frame = cv2.imdecode(np.frombuffer(step.compressed, np.uint8), cv2.IMREAD_UNCHANGED)
+            step.compressed = None
+            self.decompressions += 1
+        return step.frame
+
+    # Comprime e depois descarta os intermediários mais distantes da etapa em uso
+    def _enforce_budget(self, current):
+        def distance(item):
+            return abs(item[0] + 1 - current)
+        candidates = sorted(((i, step) for i, step in enumerate(self.steps) if i + 1 != current),
+                            key=distance, reverse=True)
+        total = sum(step.size_bytes for step in self.steps)
+        for _, step in candidates:
+            if total <= self.budget_bytes:
+                return
+            if step.frame is not None:
+                ok, encoded = cv2.imencode(".png", step.frame, [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression])
+                if ok:
+                    total -= step.frame.nbytes
+                    step.frame = None
+                    step.compressed = encoded.tobytes()
+                    total += len(step.compressed)
+                    self.compressions += 1
+        for _, step in candidates:
+            if total <= self.budget_bytes:
+                return
+            total -= step.size_bytes
+            step.discard()
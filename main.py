@@ -1,13 +1,27 @@
 import tkinter as tk
 import customtkinter as ctk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, simpledialog
 import cv2
-import numpy as np
 from PIL import Image, ImageTk
 import os
+import threading
+import time
+from contextlib import nullcontext
 from datetime import timedelta, datetime
 import pytz
-from ultralytics import YOLO
+from filters import DEFAULT_MODEL, compile_filter_chain
+from video_io import FrameCache, FrameReader, PlaybackClock, WebcamCapture
+from video_index import VideoIndex
+from export import SegmentExport, crop_zoom, segment_ranges
+from recorder import AsyncRecorder
+from detection import Detector, IntervalDetector, MotionGate, load_model
+from detection_backends import resolve_model
+from detection_cache import DetectionCache
+from perf import PerfMonitor
+from display import DisplayBuffer, fit_to_canvas
+from tiled import TiledImage, is_large_image
+from history import ImageHistory
+from multistream import MultiStream, compose_grid
 # Dependências
 # pip install opencv-python pillow numpy customtkinter pytz
 
@@ -30,16 +44,75 @@ class VideoImageProcessor:
         self.webcam_save_dir = ""
         self.webcam_record_frames = 0
         self.save_recording = False
-        self.webcam_writer = None
+        self.recorder = None
+        self.record_queue_size = 64  # Frames aguardando gravação em disco
+        self.record_drop_policy = "drop_oldest"  # Fila cheia: "block", "drop_oldest" ou "drop_newest"
+        # Webcam: thread de captura que guarda só o frame mais recente
+        self.webcam = None
+        self.webcam_sequence = 0  # último frame da webcam exibido
+        self.webcam_after_id = None
+        self.webcam_format = (None, None, None, None)  # (largura, altura, fps, fourcc); None: padrão do driver
+        # Várias fontes ao mesmo tempo (multistream.MultiStream), exibidas em mosaico
+        self.multi_stream = None
+        self.multi_stream_after_id = None
         self.video_cutpoints = []
         self.video_speed = 1.0
         self.image_offset = (0, 0)
+        # Exibição: buffers, PhotoImage e item do canvas reaproveitados entre frames
+        self.display_buffer = DisplayBuffer()
+        self.photo = None
+        self.canvas_image_id = None
+        self.resize_after_id = None
+        self.window_size = None
         self.is_paused = False
         self.is_video_reverse = False
         self.video_current_frame = 0
+        self.video_current_msec = 0.0
+        self.video_after_id = None
+        self.frame_reader = None
+        self.playback_clock = PlaybackClock()
+        # Medição de desempenho: perf_monitor acumula a sessão; profiler é ele quando o HUD
+        # está ligado (None: sem medição)
+        self.perf_monitor = PerfMonitor()
+        self.profiler = None
+        self.perf_hud_id = None
+        self.perf_hud_time = 0.0
+        self.max_presentation_fps = 30.0  # Acima disso (fps do vídeo x velocidade), a leitura pula frames
+        self.last_presented_frame = -1
+        self.speed_label_time = 0.0
+        self.video_index = None
+        self.segment_export = None
+        self.export_mode = "auto"  # "parallel", "single_pass" ou "auto" (ver export.SegmentExport)
+        self.export_batch_size = 8  # Frames por inferência do YOLO na exportação
+        self.video_buffer_size = 16  # Frames decodificados com antecedência pela thread de leitura
+        self.video_reverse_memory = 512 * 1024 * 1024  # Memória máxima (bytes) para blocos da reprodução reversa
+        # Frames originais já decodificados (pausa, quadro a quadro, saltos curtos), em bytes
+        self.frame_cache_budget = 256 * 1024 * 1024
+        self.frame_cache = FrameCache(self.frame_cache_budget)
+        self.pending_frame = None   # quadro pedido fora do cache, aguardando a thread de leitura
+        self.reader_stale = False   # a leitura não continua do frame exibido (após quadro a quadro)
         self.zoom_rect = (0, 0, 0, 0)
+        # Pré-visualização reduzida: a cadeia roda no frame já no tamanho do canvas.
+        # preview_scale é a escala do frame exibido em relação ao original.
+        self.preview_proxy = False
+        self.preview_scale = 1.0
+        # Etapas aplicadas no modo imagem, com os intermediários (desfazer/refazer, remover etapa)
+        self.image_history_budget = 512 * 1024 * 1024  # Bytes de intermediários; o excedente é comprimido
+        self.image_history = ImageHistory(budget_bytes=self.image_history_budget)
+        # Imagem grande no modo imagem (tiled.TiledImage): filtros em blocos, em memmap
+        self.large_image = None
+        self.large_original = None
 
         self.video_filters = []
+        self.filter_pipeline = None
+        self.model = None
+        self.model_path = DEFAULT_MODEL  # pesos em uso (.pt ou exportados para o backend)
+        self.detection_backend = ("pytorch", False)  # (backend, int8); ver detection_backends
+        self.detector = None
+        self.model_load_result = None  # (modelo, erro), preenchido pela thread de carregamento
+        self.model_load_begin = 0.0
+        self.detect_interval = 1  # Detecção a cada N frames (rastreamento nos intermediários)
+        self.motion_gated = False  # Sem movimento desde a última detecção, a inferência é pulada
         
         self.setup_gui()
 
@@ -79,8 +152,8 @@ class VideoImageProcessor:
         # Controles de vídeo
         self.setup_video_controls()
 
-        # Carregar modelo YOLOv8
-        self.model = YOLO("yolov8n.pt")   
+        # Carregar modelo YOLOv8 em segundo plano, depois que a janela aparecer
+        self.root.after_idle(self.start_model_loading)
 
         # Bind eventos do mouse
         self.canvas.bind("<Button-1>", self.start_roi)
@@ -88,6 +161,10 @@ class VideoImageProcessor:
         self.canvas.bind("<ButtonRelease-1>", self.end_roi)
 
         self.root.bind("<Configure>", self.window_resize)
+        self.root.bind("<Left>", lambda event: self.step_frame(-1))
+        self.root.bind("<Right>", lambda event: self.step_frame(1))
+        self.root.bind("<Control-z>", lambda event: self.undo_image_step())
+        self.root.bind("<Control-y>", lambda event: self.redo_image_step())
 
     # Método para configurar os controles superiores da interface
     def setup_top_controls(self):
@@ -216,10 +293,64 @@ class VideoImageProcessor:
                                      font=("Trebuchet MS", 12, "bold"))
         button_color.grid(row=3, column=0, padx=5, pady=5)
 
-        button_detect = ctk.CTkButton(filter_frame, text="Detec/Obj", command=self.detect_objects, corner_radius=8, 
+        self.button_detect = ctk.CTkButton(filter_frame, text="Detec/Obj", command=self.detect_objects, corner_radius=8, 
                                      width=70, height=20, fg_color="#585858", text_color="white", 
                                      font=("Trebuchet MS", 12, "bold"))
-        button_detect.grid(row=3, column=3, padx=5, pady=5)
+        self.button_detect.grid(row=3, column=3, padx=5, pady=5)
+
+        # ---- Frequência da detecção em vídeo ----
+        self.detect_interval_options = {"Detec: todo frame": 1, "Detec: a cada 3": 3,
+                                        "Detec: a cada 5": 5, "Detec: a cada 10": 10}
+        option_detect_interval = ctk.CTkOptionMenu(filter_frame, values=list(self.detect_interval_options),
+                                                   command=self.set_detect_interval, width=140, height=20,
+                                                   fg_color="#585858", button_color="#585858", text_color="white",
+                                                   font=("Trebuchet MS", 12, "bold"))
+        option_detect_interval.grid(row=3, column=1, columnspan=2, padx=5, pady=5)
+
+        # ---- Runtime da detecção (CPU) ----
+        self.detection_backend_options = {"Backend: PyTorch": ("pytorch", False),
+                                          "Backend: ONNX Runtime": ("onnx", False),
+                                          "Backend: ONNX INT8": ("onnx", True),
+                                          "Backend: OpenVINO": ("openvino", False),
+                                          "Backend: OpenVINO INT8": ("openvino", True)}
+        self.option_backend = ctk.CTkOptionMenu(filter_frame, values=list(self.detection_backend_options),
+                                                command=self.set_detection_backend, width=180, height=20,
+                                                fg_color="#585858", button_color="#585858", text_color="white",
+                                                font=("Trebuchet MS", 12, "bold"))
+        self.option_backend.grid(row=4, column=0, columnspan=4, padx=5, pady=5)
+
+        # ---- Histórico de etapas (modo imagem) ----
+        button_undo = ctk.CTkButton(filter_frame, text="Desfazer", command=self.undo_image_step, corner_radius=8,
+                                    width=70, height=20, fg_color="#585858", text_color="white",
+                                    font=("Trebuchet MS", 12, "bold"))
+        button_undo.grid(row=5, column=0, padx=5, pady=5)
+
+        button_redo = ctk.CTkButton(filter_frame, text="Refazer", command=self.redo_image_step, corner_radius=8,
+                                    width=70, height=20, fg_color="#585858", text_color="white",
+                                    font=("Trebuchet MS", 12, "bold"))
+        button_redo.grid(row=5, column=1, padx=5, pady=5)
+
+        button_remove_step = ctk.CTkButton(filter_frame, text="Remover etapa", command=self.remove_image_step,
+                                           corner_radius=8, width=70, height=20, fg_color="#585858",
+                                           text_color="white", font=("Trebuchet MS", 12, "bold"))
+        button_remove_step.grid(row=5, column=2, padx=5, pady=5)
+
+        # Marcado: o próximo filtro substitui a etapa escolhida, em vez de ser acrescentado
+        self.edit_history_step = ctk.CTkCheckBox(filter_frame, text="Editar etapa", width=70, height=20,
+                                                 text_color="white", font=("Trebuchet MS", 12, "bold"))
+        self.edit_history_step.grid(row=5, column=3, padx=5, pady=5)
+
+        self.history_step_options = {}
+        self.option_history_step = ctk.CTkOptionMenu(filter_frame, values=["Etapas: nenhuma"], width=180, height=20,
+                                                     fg_color="#585858", button_color="#585858", text_color="white",
+                                                     font=("Trebuchet MS", 12, "bold"))
+        self.option_history_step.grid(row=6, column=0, columnspan=4, padx=5, pady=5)
+
+        # ---- Detecção só quando a cena muda (vídeo e webcam) ----
+        self.checkbox_motion_gate = ctk.CTkCheckBox(filter_frame, text="Detecção por movimento",
+                                                    command=self.toggle_motion_gate, width=70, height=20,
+                                                    text_color="white", font=("Trebuchet MS", 12, "bold"))
+        self.checkbox_motion_gate.grid(row=7, column=0, columnspan=4, padx=5, pady=5)
 
         
     
@@ -248,6 +379,11 @@ class VideoImageProcessor:
         self.label_speed_value = ctk.CTkLabel(speed_frame, text="1x", text_color="#8888a3", 
                                             font=("Trebuchet MS", 12, "bold"))
         self.label_speed_value.grid(row=0, column=1, pady=5, padx=5)
+
+        # ---- Velocidade obtida (relógio de apresentação) ----
+        self.label_speed_achieved = ctk.CTkLabel(speed_frame, text="", text_color="#8888a3",
+                                                 font=("Trebuchet MS", 12, "bold"))
+        self.label_speed_achieved.grid(row=0, column=2, pady=5, padx=5)
         
         # ---- Controles de Velocidade ----
         button_speed_up = ctk.CTkButton(video_frame, text="Acelerar", command=self.speed_up, corner_radius=8, 
@@ -288,24 +424,202 @@ class VideoImageProcessor:
                                              corner_radius=8, width=70, height=20, fg_color="#585858", 
                                              text_color="white", font=("Trebuchet MS", 12, "bold"))
         self.button_record_webcam.grid(row=3, column=0, padx=5, pady=5)      
+
+        # ---- Pré-visualização reduzida ----
+        self.checkbox_preview_proxy = ctk.CTkCheckBox(video_frame, text="Prévia leve", command=self.toggle_preview_proxy,
+                                                      width=70, height=20, text_color="white",
+                                                      font=("Trebuchet MS", 12, "bold"))
+        self.checkbox_preview_proxy.grid(row=3, column=1, padx=5, pady=5)
+
+        # ---- HUD de desempenho ----
+        self.checkbox_perf_hud = ctk.CTkCheckBox(video_frame, text="HUD desempenho", command=self.toggle_perf_hud,
+                                                 width=70, height=20, text_color="white",
+                                                 font=("Trebuchet MS", 12, "bold"))
+        self.checkbox_perf_hud.grid(row=4, column=0, padx=5, pady=5)
+
+        # ---- Quadro a quadro (também pelas setas do teclado) ----
+        button_previous_frame = ctk.CTkButton(video_frame, text="◀ Quadro", command=lambda: self.step_frame(-1),
+                                              corner_radius=8, width=70, height=20, fg_color="#585858",
+                                              text_color="white", font=("Trebuchet MS", 12, "bold"))
+        button_previous_frame.grid(row=4, column=1, padx=5, pady=5)
+
+        button_next_frame = ctk.CTkButton(video_frame, text="Quadro ▶", command=lambda: self.step_frame(1),
+                                          corner_radius=8, width=70, height=20, fg_color="#585858",
+                                          text_color="white", font=("Trebuchet MS", 12, "bold"))
+        button_next_frame.grid(row=4, column=2, padx=5, pady=5)
+
+        # ---- Formato da webcam (MJPG permite resoluções altas a 30 fps via USB 2) ----
+        self.webcam_format_options = {"Webcam: padrão do driver": (None, None, None, None),
+                                      "Webcam: 640x480": (640, 480, 30, None),
+                                      "Webcam: 1280x720 MJPG": (1280, 720, 30, "MJPG"),
+                                      "Webcam: 1280x720 60 fps MJPG": (1280, 720, 60, "MJPG"),
+                                      "Webcam: 1920x1080 MJPG": (1920, 1080, 30, "MJPG")}
+        option_webcam_format = ctk.CTkOptionMenu(video_frame, values=list(self.webcam_format_options),
+                                                 command=self.set_webcam_format, width=180, height=20,
+                                                 fg_color="#585858", button_color="#585858", text_color="white",
+                                                 font=("Trebuchet MS", 12, "bold"))
+        option_webcam_format.grid(row=5, column=0, columnspan=3, padx=5, pady=5)
+
+        # ---- Várias fontes em mosaico ----
+        button_multi_stream = ctk.CTkButton(video_frame, text="Várias fontes", command=self.open_multi_stream,
+                                            corner_radius=8, width=70, height=20, fg_color="#585858",
+                                            text_color="white", font=("Trebuchet MS", 12, "bold"))
+        button_multi_stream.grid(row=6, column=0, padx=5, pady=5)
+
+        # ---- Modo da exportação de segmentos (ver export.SegmentExport) ----
+        self.export_mode_options = {"Exportar: automático": "auto",
+                                    "Exportar: paralelo": "parallel",
+                                    "Exportar: leitura única": "single_pass"}
+        option_export_mode = ctk.CTkOptionMenu(video_frame, values=list(self.export_mode_options),
+                                               command=self.set_export_mode, width=180, height=20,
+                                               fg_color="#585858", button_color="#585858", text_color="white",
+                                               font=("Trebuchet MS", 12, "bold"))
+        option_export_mode.grid(row=6, column=1, columnspan=2, padx=5, pady=5)
+
+        # ---- Fila da gravação (ver recorder.AsyncRecorder) ----
+        self.record_drop_policy_options = {"Fila cheia: descartar antigos": "drop_oldest",
+                                           "Fila cheia: descartar novos": "drop_newest",
+                                           "Fila cheia: esperar": "block"}
+        option_record_drop_policy = ctk.CTkOptionMenu(video_frame, values=list(self.record_drop_policy_options),
+                                                      command=self.set_record_drop_policy, width=180, height=20,
+                                                      fg_color="#585858", button_color="#585858", text_color="white",
+                                                      font=("Trebuchet MS", 12, "bold"))
+        option_record_drop_policy.grid(row=7, column=0, columnspan=2, padx=5, pady=5)
+
+        self.record_queue_size_options = {"Fila: 16": 16, "Fila: 64": 64, "Fila: 256": 256}
+        option_record_queue_size = ctk.CTkOptionMenu(video_frame, values=list(self.record_queue_size_options),
+                                                     command=self.set_record_queue_size, width=70, height=20,
+                                                     fg_color="#585858", button_color="#585858", text_color="white",
+                                                     font=("Trebuchet MS", 12, "bold"))
+        option_record_queue_size.set("Fila: 64")
+        option_record_queue_size.grid(row=7, column=2, padx=5, pady=5)
      
     # Função de controle do tamanho da janela
+    # <Configure> chega para cada widget da janela e repetidamente durante o arraste:
+    # só mudanças de tamanho da janela contam, e o redesenho espera o arraste parar
     def window_resize(self, event: tk.Event):
+        if event.widget is not self.root or (event.width, event.height) == self.window_size:
+            return
+        self.window_size = (event.width, event.height)
+        if self.resize_after_id is not None:
+            self.root.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.root.after(80, self.apply_window_resize)
+
+    def apply_window_resize(self):
+        self.resize_after_id = None
         #if self.root.winfo_height() < 900:
-            self.canvas.configure(height=self.root.winfo_height() - 380)
-            self.show_frame()              
+        self.canvas.configure(height=self.root.winfo_height() - 380)
+        self.show_frame()
     
     # Função de controle da troca de modo (vídeo ou imagem)
     def mode_changed(self):
-        if self.cap is not None:
-            self.cap.release()
-            self.cap = None
+        self.release_capture()
         self.current_frame = None
         self.original_frame = None
+        self.image_history.reset(None)
+        self.update_history_controls()
+        self.large_image = None
+        self.large_original = None
         self.is_paused = False
         self.zoom_rect = (0, 0, 0, 0)
         self.video_cutpoints = []
+        self.video_index = None
         self.canvas.delete("all")
+        self.canvas_image_id = None
+        self.perf_hud_id = None
+        self.preview_scale = 1.0
+
+    # Libera a captura atual e a thread de leitura do vídeo, se existirem
+    def release_capture(self):
+        self.close_detection_cache()
+        if self.detector is not None and self.detector.motion_gate is not None and \
+                self.detector.motion_gate.frames_checked:
+            print(f"Porta de movimento: {self.detector.motion_gate.stats()}")
+        if self.multi_stream is not None:
+            self.multi_stream.stop()
+            print(f"Várias fontes encerradas: {self.multi_stream.stats()}")
+            self.multi_stream = None
+        if self.webcam is not None:
+            # A thread de captura é dona do cap da webcam: parar a thread o libera
+            self.webcam.stop()
+            self.webcam = None
+            self.cap = None
+        self.frame_cache.clear()
+        self.pending_frame = None
+        self.reader_stale = False
+        if self.frame_reader is not None:
+            self.frame_reader.stop()
+            print(f"Leitura do vídeo encerrada: {self.frame_reader.stats()}")
+            self.frame_reader = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    # O import do ultralytics/torch e a leitura dos pesos levam segundos: feitos em uma
+    # thread, com o botão de detecção desabilitado até o modelo ficar pronto
+    def start_model_loading(self):
+        self.model_load_result = None
+        self.model_load_begin = time.perf_counter()
+        self.button_detect.configure(text="Carregando...", state="disabled")
+        self.option_backend.configure(state="disabled")
+        backend, int8 = self.detection_backend
+        threading.Thread(target=self.load_model_in_background, args=(backend, int8), daemon=True).start()
+        self.root.after(100, self.check_model_loading)
+
+    # Executado em segundo plano: não acessar widgets aqui.
+    # Na primeira escolha de um backend, os pesos são exportados (e quantizados, em INT8)
+    def load_model_in_background(self, backend, int8):
+        try:
+            model_path = resolve_model(DEFAULT_MODEL, backend, int8)
+            self.model_load_result = (load_model(model_path), model_path, None)
+        except Exception as e:
+            self.model_load_result = (None, None, e)
+
+    def check_model_loading(self):
+        if self.model_load_result is None:
+            self.root.after(100, self.check_model_loading)
+            return
+
+        model, model_path, error = self.model_load_result
+        self.button_detect.configure(text="Detec/Obj", state="normal")
+        self.option_backend.configure(state="normal")
+        if error is not None:
+            print(f"Erro ao carregar o modelo de detecção: {error}")
+            if self.model is not None:
+                # Troca de backend falhou: continuar com o modelo anterior
+                messagebox.showerror("Erro", f"Erro ao carregar o backend de detecção: {error}")
+            return
+        # As detecções em cache dependem dos pesos: o cache do vídeo é reaberto para o novo modelo
+        self.close_detection_cache()
+        self.model = model
+        self.model_path = model_path
+        self.filter_pipeline = None
+        self.detector = IntervalDetector(self.model, interval=self.detect_interval)
+        if self.motion_gated:
+            self.detector.motion_gate = MotionGate()
+        if self.multi_stream is not None:
+            self.multi_stream.set_model(self.model)
+        print(f"Modelo de detecção ({model_path}) carregado em {time.perf_counter() - self.model_load_begin:.2f} s")
+        # Vídeo aberto antes do modelo ficar pronto
+        if self.frame_reader is not None and self.mode_var.get() == "video":
+            self.open_detection_cache(self.current_file)
+
+    # Detecções do vídeo atual guardadas em disco: replays não rodam o modelo de novo
+    def open_detection_cache(self, filename):
+        if self.detector is None:
+            return
+        try:
+            self.detector.cache = DetectionCache.open(filename, self.model_path, self.detector.conf)
+        except Exception as e:
+            print(f"Erro ao abrir o cache de detecções: {e}")
+
+    def close_detection_cache(self):
+        if self.detector is None:
+            return
+        self.detector.frame_index = None
+        if self.detector.cache is not None:
+            self.detector.cache.save()
+            self.detector.cache = None
     
     def open_file(self):
         if self.mode_var.get() == "image":
@@ -325,10 +639,18 @@ class VideoImageProcessor:
                 self.open_image()
 
     def open_image(self):
+        self.large_image = None
+        self.large_original = None
+        self.preview_scale = 1.0
+        if is_large_image(self.current_file):
+            self.open_large_image()
+            return
         try:
             self.current_frame = cv2.imread(self.current_file)
             if self.current_frame is not None:
                 self.original_frame = self.current_frame.copy()
+                self.image_history.reset(self.original_frame)
+                self.update_history_controls()
                 self.show_frame()
             else:
                 messagebox.showerror("Erro", "A imagem não foi carregada corretamente.")
@@ -338,10 +660,85 @@ class VideoImageProcessor:
             messagebox.showerror("Erro", f"Erro ao carregar ou processar a imagem: {e}")
             self.original_frame = None
 
+    # Imagens acima de tiled.LARGE_IMAGE_PIXELS: nada em resolução total fica em memória
+    def open_large_image(self):
+        self.current_frame = None
+        self.original_frame = None
+        self.zoomed_frame = None
+        try:
+            self.large_image = self.large_original = TiledImage.open(self.current_file)
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao carregar ou processar a imagem: {e}")
+            return
+        self.show_frame()
+
+    # Etapa do modo imagem. Em "Independente" a etapa substitui as anteriores (o resultado
+    # parte da imagem original); com "Editar etapa" marcado, substitui a etapa escolhida.
+    def apply_image_filter(self, filter_name, stage=None):
+        stage = stage or compile_filter_chain([filter_name])
+        history = self.image_history
+        try:
+            index = self.selected_history_step()
+            if self.edit_history_step.get() and index is not None:
+                self.current_frame = history.replace(index, filter_name, stage)
+                self.edit_history_step.deselect()
+            else:
+                if self.processing_mode.get() == 'independent':
+                    history.truncate(0)
+                self.current_frame = history.apply(filter_name, stage)
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao aplicar o filtro: {e}")
+            return
+        self.show_frame()
+        self.update_history_controls()
+
+    def undo_image_step(self):
+        if self.mode_var.get() == 'image' and self.large_image is None and self.image_history.can_undo():
+            self.current_frame = self.image_history.undo()
+            self.show_frame()
+            self.update_history_controls()
+
+    def redo_image_step(self):
+        if self.mode_var.get() == 'image' and self.large_image is None and self.image_history.can_redo():
+            self.current_frame = self.image_history.redo()
+            self.show_frame()
+            self.update_history_controls()
+
+    # Remove a etapa escolhida; só as etapas seguintes são recalculadas
+    def remove_image_step(self):
+        index = self.selected_history_step()
+        if self.mode_var.get() != 'image' or index is None:
+            return
+        try:
+            self.current_frame = self.image_history.remove(index)
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao remover a etapa: {e}")
+            return
+        self.show_frame()
+        self.update_history_controls()
+
+    def selected_history_step(self):
+        return self.history_step_options.get(self.option_history_step.get())
+
+    def update_history_controls(self):
+        names = self.image_history.step_names()
+        self.history_step_options = {f"{i + 1}. {name}": i for i, name in enumerate(names)}
+        values = list(self.history_step_options) or ["Etapas: nenhuma"]
+        self.option_history_step.configure(values=values)
+        self.option_history_step.set(values[-1])
+
+    def apply_large_image_filter(self, filter_name):
+        source = self.large_original if self.processing_mode.get() == 'independent' else self.large_image
+        try:
+            self.large_image = source.apply([filter_name])
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao aplicar o filtro: {e}")
+            return
+        self.show_frame()
+
     def open_video(self):
         # Liberar recurso de vídeo anterior se existir
-        if hasattr(self, 'cap') and self.cap is not None:
-            self.cap.release()
+        self.release_capture()
             
         try:
             self.cap = cv2.VideoCapture(self.current_file)
@@ -354,26 +751,75 @@ class VideoImageProcessor:
             self.is_video_reverse = False
             self.video_speed = 1.0
             self.video_current_frame = 0
+            self.video_current_msec = 0.0
             self.video_filters = []
+            self.video_cutpoints = []
+            self.video_index = None
+            if self.detector is not None:
+                self.detector.reset()
+            self.open_detection_cache(self.current_file)
+            self.playback_clock = PlaybackClock(self.video_speed)
+            self.last_presented_frame = -1
+
+            # Decodificação em segundo plano
+            self.frame_reader = FrameReader(self.cap, buffer_size=self.video_buffer_size,
+                                            reverse_memory_budget=self.video_reverse_memory)
+            self.update_frame_step()
+            self.frame_reader.profiler = self.profiler
+            self.frame_cache = FrameCache(self.frame_cache_budget)
+            self.frame_reader.frame_cache = self.frame_cache
+            self.frame_reader.start()
+
+            # Índice de frames/keyframes (varredura única, depois lido do cache em disco)
+            threading.Thread(target=self.load_video_index, args=(self.frame_reader, self.current_file),
+                             daemon=True).start()
             
             # Iniciar reprodução do vídeo
             self.update_video_frame()
             
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao abrir o vídeo: {e}")
-            if hasattr(self, 'cap') and self.cap is not None:
-                self.cap.release()
+            self.release_capture()
+
+    # Executado em segundo plano: não acessar widgets aqui
+    def load_video_index(self, reader, filename):
+        try:
+            index = VideoIndex.load_or_build(filename)
+        except Exception as e:
+            print(f"Erro ao indexar o vídeo: {e}")
+            return
+        reader.keyframes = index.keyframes
+        reader.index = index
+        # Ignorar se outro vídeo foi aberto nesse meio tempo
+        if reader is self.frame_reader:
+            self.video_index = index
+
+    # Timestamp (ms) de um frame, pelo índice quando ele já estiver pronto
+    def video_frame_time(self, frame_index):
+        if self.video_index is not None:
+            return self.video_index.time_of(frame_index)
+        return frame_index * 1000.0 / self.frame_reader.fps
 
     def open_webcam(self):
         # Liberar recurso de webcam anterior se existir
-        if hasattr(self, 'cap') and self.cap is not None:
-            self.cap.release()
+        self.release_capture()
 
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                messagebox.showerror("Erro", "Não foi possível acessar a webcam.")
+            try:
+                self.webcam = WebcamCapture(0, *self.webcam_format).start()
+            except IOError as e:
+                self.webcam = None
+                messagebox.showerror("Erro", str(e))
                 return
+            self.cap = self.webcam.cap
+            self.webcam_sequence = 0
+            # Manter um único ciclo de atualização (reabertura com outro formato)
+            if self.webcam_after_id is not None:
+                self.root.after_cancel(self.webcam_after_id)
+                self.webcam_after_id = None
+            settings = self.webcam.settings()
+            print(f"Webcam: {settings['width']}x{settings['height']} a {settings['fps']:.0f} fps, "
+                  f"formato {settings['fourcc'] or '?'}")
 
             # Configurações iniciais da webcam
             self.recording = False
@@ -384,131 +830,302 @@ class VideoImageProcessor:
             
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao inicializar a webcam: {e}")
-            if hasattr(self, 'cap') and self.cap is not None:
-                self.cap.release()
-
-    def detect_objects(self):
-        if not hasattr(self, 'model'):
-            messagebox.showerror("Erro", "Modelo de detecção não carregado.")
-            return
-            
-        if self.mode_var.get() == 'image':
-            if self.current_frame is None:
-                return
-                
-            if self.processing_mode.get() == 'independent':
-                self.current_frame = self.original_frame.copy()
-            
-            try:
-                results = self.model(self.current_frame, conf=0.5)
-                self.current_frame = results[0].plot()
-                self.show_frame()
-            except Exception as e:
-                messagebox.showerror("Erro", f"Erro na detecção: {e}")
-                
-        elif self.mode_var.get() in ['video', 'webcam']:
-            if 'detect_objects' not in self.video_filters:
-                self.video_filters.append('detect_objects')
+            self.release_capture()
 
     def apply_filters_on_video(self, frame):
         if frame is None:
             return None
         
-        processed_frame = frame.copy()
-        
         try:
-            for filter_name in self.video_filters:
-                if filter_name == 'detect_objects':
-                    results = self.model(processed_frame, conf=0.5)
-                    processed_frame = results[0].plot()
-                
-                elif filter_name == 'blur':
-                    processed_frame = cv2.GaussianBlur(processed_frame, (5,5), 0)
-                
-                elif filter_name == 'sharpen':
-                    kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-                    processed_frame = cv2.filter2D(processed_frame, -1, kernel)
-                
-                elif filter_name == 'emboss':
-                    kernel = np.array([[-2,-1,0], [-1,1,1], [0,1,2]])
-                    processed_frame = cv2.filter2D(processed_frame, -1, kernel)
-                
-                elif filter_name == 'laplacian':
-                    processed_frame = cv2.Laplacian(processed_frame, cv2.CV_64F).astype(np.uint8)
-                
-                elif filter_name == 'canny':
-                    processed_frame = cv2.Canny(processed_frame, 100, 200)
-                    processed_frame = cv2.cvtColor(processed_frame, cv2.COLOR_GRAY2BGR)
-                
-                elif filter_name == 'sobel':
-                    grad_x = cv2.Sobel(processed_frame, cv2.CV_64F, 1, 0, ksize=3)
-                    grad_y = cv2.Sobel(processed_frame, cv2.CV_64F, 0, 1, ksize=3)
-                    abs_grad_x = cv2.convertScaleAbs(grad_x)
-                    abs_grad_y = cv2.convertScaleAbs(grad_y)
-                    processed_frame = cv2.addWeighted(abs_grad_x, 0.5, abs_grad_y, 0.5, 0)
-                
-                elif filter_name == 'gray':
-                    processed_frame = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2GRAY)
-                    processed_frame = cv2.cvtColor(processed_frame, cv2.COLOR_GRAY2BGR)
-                
-                elif filter_name == 'binary':
-                    gray = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2GRAY)
-                    _, processed_frame = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
-                    processed_frame = cv2.cvtColor(processed_frame, cv2.COLOR_GRAY2BGR)
-                    
+            # Recompilar a cadeia somente quando ela muda
+            if self.filter_pipeline is None or not self.filter_pipeline.matches(self.video_filters, self.detector):
+                self.filter_pipeline = compile_filter_chain(self.video_filters, self.detector)
+            self.filter_pipeline.profiler = self.profiler
+            processed_frame = self.filter_pipeline(frame)
         except Exception as e:
-            print(f"Erro ao aplicar filtro {filter_name}: {e}")
+            print(f"Erro ao aplicar filtros {self.video_filters}: {e}")
             return frame
             
         return processed_frame
 
+    # Filtros + zoom do frame exibido. Na pré-visualização reduzida o frame é reduzido ao
+    # tamanho do canvas antes da cadeia; a gravação da webcam continua em resolução total.
+    def process_display_frame(self, frame):
+        scale = 1.0
+        if self.preview_proxy and not getattr(self, 'recording', False):
+            scale = self.proxy_scale(frame)
+        if scale < 1.0:
+            height, width = frame.shape[:2]
+            # INTER_LINEAR, como na exibição: INTER_AREA em escalas não inteiras custa mais que a cadeia
+            with self.measure("prévia: reduzir"):
+                frame = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                                   interpolation=cv2.INTER_LINEAR)
+        self.preview_scale = scale
+
+        processed_frame = self.apply_filters_on_video(frame)
+        if self.is_zoomed():
+            with self.measure("zoom"):
+                processed_frame = self.apply_zoom_video(processed_frame)
+        return processed_frame
+
+    # Contexto que mede uma etapa quando o HUD de desempenho está ligado
+    def measure(self, stage):
+        return self.profiler.measure(stage) if self.profiler is not None else nullcontext()
+
+    def toggle_perf_hud(self):
+        self.profiler = self.perf_monitor if self.checkbox_perf_hud.get() else None
+        if self.frame_reader is not None:
+            self.frame_reader.profiler = self.profiler
+        if self.profiler is None and self.perf_hud_id is not None:
+            self.canvas.delete(self.perf_hud_id)
+            self.perf_hud_id = None
+
+    # Frame apresentado: FPS efetivo e, duas vezes por segundo, o texto do HUD
+    def frame_presented(self):
+        if self.profiler is None:
+            return
+        self.profiler.frame_presented()
+        now = time.perf_counter()
+        if now - self.perf_hud_time < 0.5:
+            return
+        self.perf_hud_time = now
+        self.profiler.snapshot()
+        lines = self.profiler.format_lines()
+        gate = self.detector.motion_gate if self.detector is not None else None
+        if gate is not None and gate.frames_checked:
+            lines.append(f"detecção pulada: {gate.skip_ratio():.0%} (movimento {gate.last_score:.3f})")
+        if self.frame_reader is not None:
+            stats = self.frame_reader.stats()
+            lines.append(f"leitura: buffer {stats['buffered']}/{stats['buffer_size']}  "
+                         f"underruns {stats['underruns']}")
+        text = "\n".join(lines)
+        if self.perf_hud_id is None:
+            self.perf_hud_id = self.canvas.create_text(8, 8, text=text, anchor=tk.NW, fill="#00ff00",
+                                                       font=("Courier", 10, "bold"))
+        else:
+            self.canvas.itemconfigure(self.perf_hud_id, text=text)
+        self.canvas.tag_raise(self.perf_hud_id)
+
+    # Fim da sessão: resumo das medições em CSV
+    def dump_perf_log(self):
+        if not self.perf_monitor.summary():
+            return
+        try:
+            print(f"Medições de desempenho salvas em {self.perf_monitor.dump_csv()}")
+        except OSError as e:
+            print(f"Não foi possível salvar as medições de desempenho: {e}")
+
+    # Escala em que a região exibida (o frame ou o recorte do zoom) cabe no canvas
+    def proxy_scale(self, frame):
+        height, width = frame.shape[:2]
+        if self.is_zoomed():
+            x1, x2, y1, y2 = self.zoom_rect
+            width, height = max(1, abs(x2 - x1)), max(1, abs(y2 - y1))
+        canvas_width = max(1, self.canvas.winfo_width())
+        canvas_height = max(1, self.canvas.winfo_height())
+        return min(1.0, canvas_width / width, canvas_height / height)
+
+    # Frame atual processado em resolução total (Salvar ROI na pré-visualização reduzida).
+    # Usa um detector próprio para não alterar o rastreamento da reprodução.
+    def full_resolution_frame(self):
+        detector = None
+        if self.detector is not None:
+            detector = Detector(self.model, self.detector.conf)
+            detector.cache = self.detector.cache
+            detector.frame_index = self.detector.frame_index
+        frame = compile_filter_chain(self.video_filters, detector)(self.original_frame)
+        if self.is_zoomed():
+            frame = crop_zoom(frame, self.zoom_rect)
+        return frame
+
+    def toggle_preview_proxy(self):
+        self.preview_proxy = bool(self.checkbox_preview_proxy.get())
+        self.refresh_paused_frame()
+
+    # Reaplica filtros e zoom ao frame pausado na tela, que já está em memória (antes os
+    # botões chamavam update_video_frame, que não faz nada com o vídeo pausado)
+    def refresh_paused_frame(self):
+        if not self.is_paused or self.original_frame is None or self.mode_var.get() != "video":
+            return
+        if self.detector is not None:
+            self.detector.frame_index = self.video_current_frame
+        self.current_frame = self.process_display_frame(self.original_frame)
+        self.show_frame()
+
     def update_video_frame(self):
-        if not hasattr(self, 'cap') or self.cap is None:
+        if not hasattr(self, 'cap') or self.cap is None or self.frame_reader is None:
             return
+
+        # Manter um único ciclo de atualização agendado
+        if self.video_after_id is not None:
+            self.root.after_cancel(self.video_after_id)
+            self.video_after_id = None
             
+        delay = 30
         if not self.is_paused:
             try:
-                if self.is_video_reverse:
-                    if self.video_current_frame > 0:
-                        self.video_current_frame -= 1
-                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.video_current_frame)
-                
-                ret, frame = self.cap.read()
-                if ret:
-                    self.original_frame = frame.copy()
-                    self.current_frame = self.apply_filters_on_video(self.original_frame)
-                    
-                    if hasattr(self, 'is_zoomed') and self.is_zoomed():
-                        self.current_frame = self.apply_zoom_video(self.current_frame)
-                    
-                    self.show_frame()
-                    self.video_current_frame += 1
-                else:
-                    # Reiniciar o vídeo quando chegar ao fim
-                    self.video_current_frame = 0
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    
+                delay = self.present_next_video_frame()
             except Exception as e:
                 print(f"Erro ao atualizar frame do vídeo: {e}")
+        elif self.pending_frame is not None:
+            delay = self.present_pending_frame()
         
-        # Calcular delay baseado na velocidade
-        delay = int(30 / self.video_speed) if hasattr(self, 'video_speed') else 30
-        self.root.after(delay, self.update_video_frame)
-
+        self.video_after_id = self.root.after(delay, self.update_video_frame)
+
+    # Apresenta o frame cuja hora chegou no relógio de apresentação, descartando os que já
+    # passaram da hora; devolve a espera (ms) até a próxima verificação
+    def present_next_video_frame(self):
+        clock = self.playback_clock
+        # Intervalo de vídeo entre dois frames entregues (maior no avanço rápido)
+        frame_duration = 1000.0 * self.frame_reader.frame_step / self.frame_reader.fps
+        while True:
+            # Apenas olha o próximo frame já decodificado; com o buffer vazio, tenta logo depois
+            item = self.frame_reader.peek()
+            if item is None:
+                return 5
+            frame_index, frame_msec, frame = item
+
+            # O vídeo recomeçou do início: reancorar o relógio e descartar o rastreamento e a
+            # referência da porta de movimento, que são do fim do vídeo
+            if not self.is_video_reverse and frame_index < self.last_presented_frame:
+                clock.reset()
+                if self.detector is not None:
+                    self.detector.reset()
+                self.last_presented_frame = -1
+            if not clock.anchored:
+                clock.anchor(frame_msec)
+
+            lateness = clock.lateness(frame_msec)
+            if lateness < 0:
+                return max(1, int(clock.delay_until(frame_msec)))
+            self.frame_reader.read()
+
+            # Tão atrasado que o próximo frame também já está na hora: não apresentar
+            if lateness >= frame_duration and self.frame_reader.buffered() > 0:
+                clock.dropped()
+                continue
+
+            self.show_video_frame(*item)
+            self.frame_presented()
+            clock.presented(frame_msec)
+            self.update_achieved_speed()
+            return 1
+
+    def show_video_frame(self, frame_index, frame_msec, frame):
+        self.video_current_frame, self.video_current_msec, self.original_frame = frame_index, frame_msec, frame
+        self.last_presented_frame = frame_index
+        if self.detector is not None:
+            self.detector.frame_index = frame_index
+        self.current_frame = self.process_display_frame(frame)
+        self.show_frame()
+
+    # Quadro a quadro (pausa o vídeo). Frames no cache são exibidos na hora; os demais são
+    # pedidos à thread de leitura e exibidos por present_pending_frame.
+    def step_frame(self, delta):
+        if self.frame_reader is None or self.mode_var.get() != "video":
+            return
+        self.is_paused = True
+        target = self.video_current_frame + delta
+        frame_count = self.frame_reader.frame_count
+        if target < 0 or (frame_count > 0 and target >= frame_count):
+            return
+        self.reader_stale = True
+        # As caixas rastreadas não valem para um frame anterior
+        if delta < 0 and self.detector is not None:
+            self.detector.reset()
+        cached = self.frame_cache.get(target)
+        if cached is not None:
+            self.pending_frame = None
+            self.show_video_frame(target, *cached)
+            return
+        self.pending_frame = target
+        self.frame_reader.frame_step = 1
+        item = self.frame_reader.peek()
+        if item is None or item[0] != target:
+            self.frame_reader.seek(target, reverse=False)
+
+    # Com o vídeo pausado: exibe o quadro pedido por step_frame assim que for decodificado
+    # (os seguintes continuam sendo decodificados e ficam no cache para o próximo passo)
+    def present_pending_frame(self):
+        while True:
+            item = self.frame_reader.read()
+            if item is None:
+                return 5
+            if item[0] == self.pending_frame:
+                self.pending_frame = None
+                self.show_video_frame(*item)
+                return 30
+
+    # Avanço rápido: entregar só os frames que podem ser apresentados; os demais são
+    # pulados pela leitura com grab(), sem conversão nem filtros
+    def update_frame_step(self):
+        if self.frame_reader is not None:
+            frames_per_second = self.video_speed * self.frame_reader.fps
+            self.frame_reader.frame_step = max(1, int(frames_per_second / self.max_presentation_fps))
+
+    # Velocidade realmente obtida, ao lado da pedida (atualizada duas vezes por segundo)
+    def update_achieved_speed(self):
+        now = time.perf_counter()
+        if now - self.speed_label_time < 0.5:
+            return
+        self.speed_label_time = now
+        achieved = self.playback_clock.achieved_speed()
+        self.label_speed_achieved.configure(text="({:.1f}x)".format(achieved) if achieved else "")
+
+    # Posicionar o vídeo em um frame (descarta os frames já decodificados)
+    def seek_video(self, frame_index):
+        if self.frame_reader is not None:
+            self.frame_reader.seek(frame_index, reverse=self.is_video_reverse)
+        self.playback_clock.reset(reverse=self.is_video_reverse)
+        self.last_presented_frame = -1
+        # As caixas rastreadas não valem mais após o salto
+        if self.detector is not None:
+            self.detector.reset()
+
+    # Recarrega o modelo no backend escolhido (exportado para ONNX/OpenVINO na primeira vez)
+    def set_detection_backend(self, choice):
+        backend = self.detection_backend_options[choice]
+        if backend == self.detection_backend and self.model is not None:
+            return
+        self.detection_backend = backend
+        self.start_model_loading()
+
+    # Detecção a cada N frames; nos intermediários as caixas são rastreadas
+    def set_detect_interval(self, choice):
+        self.detect_interval = self.detect_interval_options[choice]
+        if self.detector is not None:
+            self.detector.interval = self.detect_interval
+            self.detector.reset()
+
+    # Porta de movimento: a detecção roda só quando o frame mudou desde a última detecção;
+    # nos demais, as caixas anteriores são reaproveitadas
+    def toggle_motion_gate(self):
+        self.motion_gated = bool(self.checkbox_motion_gate.get())
+        if self.detector is not None:
+            self.detector.motion_gate = MotionGate() if self.motion_gated else None
+            self.detector.reset()
+        self.refresh_paused_frame()
+
+    # Pega só o frame mais recente da thread de captura (os que chegaram durante o
+    # processamento do anterior são descartados, em vez de se acumularem no driver)
     def update_webcam_frame(self):
-        if not hasattr(self, 'cap') or self.cap is None:
+        self.webcam_after_id = None
+        webcam = self.webcam
+        if webcam is None:
             return
             
+        item = None
         try:
-            ret, frame = self.cap.read()
-            if ret and frame is not None:
-                self.original_frame = frame.copy()
-                self.current_frame = self.apply_filters_on_video(frame)
-                
-                if hasattr(self, 'is_zoomed') and self.is_zoomed():
-                    self.current_frame = self.apply_zoom_video(self.current_frame)
-                else:
-                    self.show_frame()
+            item = webcam.read_latest(self.webcam_sequence)
+            if item is not None:
+                self.webcam_sequence, captured_at, frame = item
+                # Cada leitura da thread é um array novo: não precisa de cópia
+                self.original_frame = frame
+                self.current_frame = self.process_display_frame(frame)
+                self.show_frame()
+                self.frame_presented()
+                if self.profiler is not None:
+                    self.profiler.record("webcam: captura→tela", time.perf_counter() - captured_at)
                 
                 if hasattr(self, 'recording') and self.recording:
                     self.save_webcam_record()
@@ -516,45 +1133,126 @@ class VideoImageProcessor:
         except Exception as e:
             print(f"Erro ao capturar frame da webcam: {e}")
         
-        self.root.after(10, self.update_webcam_frame)
+        # Sem frame novo, verificar de novo logo (um frame a 30 fps leva 33 ms)
+        self.webcam_after_id = self.root.after(1 if item is not None else 4, self.update_webcam_frame)
+
+    # Webcams (índices) e/ou vídeos processados ao mesmo tempo, com os filtros da interface
+    # e um único modelo de detecção para todos
+    def open_multi_stream(self):
+        cameras = simpledialog.askstring("Várias fontes", "Webcams (índices separados por vírgula, ex.: 0,1).\n"
+                                         "Em seguida, escolha os vídeos (opcional).", parent=self.root)
+        if cameras is None:
+            return
+        try:
+            sources = [int(index) for index in cameras.replace(";", ",").split(",") if index.strip()]
+        except ValueError:
+            messagebox.showerror("Erro", "Índices de webcam inválidos.")
+            return
+        sources += list(filedialog.askopenfilenames(filetypes=[("Video files", "*.mp4 *.avi *.mov")]))
+        if not sources:
+            return
+
+        self.release_capture()
+        self.mode_var.set("webcam")
+        self.video_filters = []
+        self.filter_pipeline = None
+        self.zoom_rect = (0, 0, 0, 0)
+        # O canvas passa a mostrar o mosaico: nada da fonte anterior vale para ROI e zoom
+        self.current_frame = None
+        self.original_frame = None
+        self.large_image = None
+        self.large_original = None
+        self.preview_scale = 1.0
+        try:
+            self.multi_stream = MultiStream(sources, self.video_filters, self.model, self.webcam_format).start()
+        except Exception as e:
+            self.multi_stream = None
+            messagebox.showerror("Erro", f"Erro ao abrir as fontes: {e}")
+            return
+        if self.multi_stream_after_id is None:
+            self.update_multi_stream()
+
+    # Mosaico com o último frame processado de cada fonte e o fps de cada uma
+    def update_multi_stream(self):
+        self.multi_stream_after_id = None
+        if self.multi_stream is None:
+            return
+        outputs = self.multi_stream.outputs()
+        if any(frame is not None for _, frame, _ in outputs):
+            canvas_width = max(1, self.canvas.winfo_width())
+            canvas_height = max(1, self.canvas.winfo_height())
+            with self.measure("mosaico"):
+                self.current_frame = compose_grid(outputs, (canvas_width, canvas_height))
+            self.show_frame()
+            self.frame_presented()
+        self.multi_stream_after_id = self.root.after(15, self.update_multi_stream)
+
+    # Resolução/fps/formato pedidos à webcam; reabre a captura se ela estiver aberta
+    def set_webcam_format(self, choice):
+        self.webcam_format = self.webcam_format_options[choice]
+        if self.webcam is None:
+            return
+        if self.recording:
+            messagebox.showwarning("Webcam", "Pare a gravação para trocar o formato da webcam.")
+            return
+        self.open_webcam()
 
     def show_frame(self):
+        if self.large_image is not None:
+            self.show_large_image()
+            return
         if self.current_frame is None:
             return
             
         try:
-            # Converter BGR para RGB
-            frame_rgb = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2RGB)
-            
-            # Redimensionar mantendo proporção
-            height, width = frame_rgb.shape[:2]
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            
-            self.ratio = max(width/canvas_width, height/canvas_height)
-            new_width = int(width / self.ratio)
-            new_height = int(height / self.ratio)
+            self.render_frame(self.current_frame)
+        except Exception as e:
+            print(f"Erro ao exibir frame: {e}")
 
-            # Redimensionar frame
-            frame_resized = cv2.resize(frame_rgb, (new_width, new_height))
-            
-            # Converter para PhotoImage
-            self.photo = ImageTk.PhotoImage(image=Image.fromarray(frame_resized))
-            
-            # Calcular posição central
-            x_center = canvas_width // 2
-            y_center = canvas_height // 2
-            
-            # Atualizar canvas
-            self.canvas.delete("all")
-            self.canvas.create_image(x_center, y_center, image=self.photo, anchor=tk.CENTER)
-            
-            # Manter referência
-            self.canvas.image = self.photo
-            
+    # Só a região visível (a imagem ou o recorte do zoom) é lida, já no tamanho do canvas;
+    # preview_scale leva as coordenadas da ROI de volta à resolução total
+    def show_large_image(self):
+        canvas_width = max(1, self.canvas.winfo_width())
+        canvas_height = max(1, self.canvas.winfo_height())
+        width = self.large_image.shape[1]
+        _, size, _ = fit_to_canvas(self.large_image.shape, canvas_width, canvas_height)
+        try:
+            with self.measure("exibição: blocos"):
+                view = self.large_image.render(size)
+            self.preview_scale = size[0] / width
+            self.render_frame(view)
         except Exception as e:
             print(f"Erro ao exibir frame: {e}")
 
+    # Redimensiona primeiro e converte BGR->RGB só o buffer já no tamanho do canvas.
+    # Os buffers, o PhotoImage e o item do canvas são reaproveitados (paste no lugar)
+    # enquanto o tamanho exibido não muda.
+    def render_frame(self, frame):
+        # Redimensionar mantendo proporção
+        canvas_width = max(1, self.canvas.winfo_width())
+        canvas_height = max(1, self.canvas.winfo_height())
+        self.ratio, size, self.image_offset = fit_to_canvas(frame.shape, canvas_width, canvas_height)
+
+        with self.measure("exibição: converter"):
+            frame_rgb, reallocated = self.display_buffer.convert(frame, size)
+        if reallocated or self.photo is None:
+            self.photo = ImageTk.PhotoImage("RGB", size)
+            if self.canvas_image_id is not None:
+                self.canvas.itemconfigure(self.canvas_image_id, image=self.photo)
+        with self.measure("exibição: Tk"):
+            self.photo.paste(Image.fromarray(frame_rgb))
+
+        # Atualizar canvas (centralizado)
+        if self.canvas_image_id is None:
+            self.canvas_image_id = self.canvas.create_image(canvas_width // 2, canvas_height // 2,
+                                                            image=self.photo, anchor=tk.CENTER)
+            self.canvas.tag_lower(self.canvas_image_id)
+        else:
+            self.canvas.coords(self.canvas_image_id, canvas_width // 2, canvas_height // 2)
+        # O retângulo da ROI sai no frame seguinte, como quando o canvas era limpo a cada frame
+        if not self.drawing_roi:
+            self.canvas.delete("roi")
+
     # ----------- Funções de ROI -------------
     def start_roi(self, event):
         self.roi_points = [(event.x, event.y)]
@@ -586,24 +1284,29 @@ class VideoImageProcessor:
             x1, y1 = self.roi_points[0]
             x2, y2 = self.roi_points[1]
 
-            print(self.image_offset[0], self.image_offset[1], self.ratio)
+            # Pixels do frame original por pixel do canvas (o frame exibido pode estar reduzido)
+            ratio = self.ratio / self.preview_scale
 
-            x1 = int((x1 - self.image_offset[0]) * self.ratio)
-            x2 = int((x2 - self.image_offset[0]) * self.ratio)
-            y1 = int((y1 - self.image_offset[1]) * self.ratio)
-            y2 = int((y2 - self.image_offset[1]) * self.ratio)
+            x1 = int((x1 - self.image_offset[0]) * ratio)
+            x2 = int((x2 - self.image_offset[0]) * ratio)
+            y1 = int((y1 - self.image_offset[1]) * ratio)
+            y2 = int((y2 - self.image_offset[1]) * ratio)
 
             x1 = max(0, x1)
             y1 = max(0, y1)
 
             if self.roi_zoom_var.get() == 'roi':
-                # Extrair ROI
-                self.roi_image = self.current_frame[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
+                # Extrair ROI (sempre da resolução total)
+                if self.large_image is not None:
+                    self.roi_image = self.large_image.crop((x1, x2, y1, y2)).to_array()
+                else:
+                    frame = self.full_resolution_frame() if self.preview_scale < 1.0 else self.current_frame
+                    self.roi_image = frame[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
 
                 if messagebox.askyesno("Abrir ROI", "Abrir em janela separada?"):
                     try:
-                        roi_ = cv2.resize(self.roi_image, (max(1, int(self.roi_image.shape[1] / self.ratio)), 
-                                                        max(1, int(self.roi_image.shape[0] / self.ratio))))
+                        roi_ = cv2.resize(self.roi_image, (max(1, int(self.roi_image.shape[1] / ratio)), 
+                                                        max(1, int(self.roi_image.shape[0] / ratio))))
                     except Exception as e:
                         print("Erro ao tentar adquirir ROI")
                         return
@@ -635,8 +1338,7 @@ class VideoImageProcessor:
             elif self.roi_zoom_var.get() == 'zoom':
                 if messagebox.askyesno("Zoom", "Deseja aplicar Zoom?"):
                     self.zoom_rect = (x1, x2, y1, y2)
-                    if self.is_paused:
-                            self.update_video_frame()
+                    self.refresh_paused_frame()
                     if self.mode_var.get() == "image":
                         self.apply_zoom_image()
 
@@ -647,17 +1349,29 @@ class VideoImageProcessor:
     def speed_up(self):
         if self.video_speed < 5:
             self.video_speed *= 1.5
+        self.playback_clock.set_speed(self.video_speed)
+        self.update_frame_step()
         self.label_speed_value.configure(text="{:.1f}".format(self.video_speed) + 'x')
     
     def slow_down(self):
         if self.video_speed > 0.1:
             self.video_speed *= 0.75
+        self.playback_clock.set_speed(self.video_speed)
+        self.update_frame_step()
         self.label_speed_value.configure(text="{:.1f}".format(self.video_speed) + 'x')
 
     # Pausa    
     def toggle_pause(self):
         self.is_paused = not self.is_paused
         if not self.is_paused:
+            # Retomar a partir do frame exibido, sem "recuperar" o tempo parado
+            self.playback_clock.reset()
+            if self.reader_stale:
+                # Depois do quadro a quadro, a leitura está em outra posição
+                self.reader_stale = False
+                self.pending_frame = None
+                self.update_frame_step()
+                self.seek_video(self.video_current_frame + (-1 if self.is_video_reverse else 1))
             self.update_video_frame()
     
     # Direção de reprodução do vídeo
@@ -667,20 +1381,31 @@ class VideoImageProcessor:
                 self.is_video_reverse = False
             else:
                 self.is_video_reverse = True
+
+            # Descartar o que foi decodificado na direção antiga e seguir a partir do frame exibido
+            step = -1 if self.is_video_reverse else 1
+            self.seek_video(self.video_current_frame + step)
     
     # Marcar ponto de corte
     def mark_cutpoint(self):
         if self.cap is not None:
-            current_time = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
             if self.mode_var.get() == "video":
-                self.video_cutpoints.append(current_time)
+                # Número do frame exibido (o cap está à frente, preenchendo o buffer)
+                self.video_cutpoints.append(self.video_current_frame)
+                current_time = self.video_frame_time(self.video_current_frame) / 1000.0
                 messagebox.showinfo("Ponto Marcado", 
                                 f"Tempo marcado: {timedelta(seconds=int(current_time))}")
     
     def record_webcam(self):
         if self.mode_var.get() != "webcam":
             return
+        if self.multi_stream is not None:
+            messagebox.showwarning("Gravação", "A gravação não está disponível com várias fontes abertas.")
+            return
         if self.recording == False:
+            if self.cap is None:
+                messagebox.showwarning("Gravação", "Abra a webcam antes de gravar.")
+                return
             save_mode = messagebox.askyesno("Modo de Salvamento", 
                                       "Deseja salvar como frames?\n'Sim' para frames, 'Não' para vídeo")
             
@@ -700,11 +1425,17 @@ class VideoImageProcessor:
             width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-            # Grava o arquivo do vídeo salvo
-            time_now = datetime.now(pytz.timezone("America/Manaus"))
-            output_path = os.path.join(self.webcam_save_dir, f"segment_{time_now.strftime('%Y-%m-%d_%H-%M-%S')}.mp4")
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            self.webcam_writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            if self.recording_mode == "video":
+                # Grava o arquivo do vídeo salvo
+                time_now = datetime.now(pytz.timezone("America/Manaus"))
+                output_path = os.path.join(self.webcam_save_dir, f"segment_{time_now.strftime('%Y-%m-%d_%H-%M-%S')}.mp4")
+            else:
+                output_path = os.path.join(self.webcam_save_dir, "recorded_frames")
+
+            # Codificação e escrita em disco em uma thread própria
+            self.recorder = AsyncRecorder(output_path, self.recording_mode, fps, (width, height),
+                                          queue_size=self.record_queue_size,
+                                          drop_policy=self.record_drop_policy).start()
 
             self.button_record_webcam.configure(text="Parar Gravação")
             self.recording = True
@@ -713,32 +1444,47 @@ class VideoImageProcessor:
         else:
             self.recording = False
             self.button_record_webcam.configure(text="Iniciar Gravação")
-            self.webcam_writer.release()
+            self.recorder.stop()
+            stats = self.recorder.stats()
+            self.recorder = None
+            print(f"Gravação finalizada: {stats['frames_written']} frames gravados, "
+                  f"{stats['frames_dropped']} descartados, fila máxima {stats['max_queue_depth']}/{stats['queue_size']}")
+            if stats['frames_dropped']:
+                messagebox.showwarning("Gravação", f"{stats['frames_dropped']} frame(s) descartado(s): "
+                                                   "o disco não acompanhou a captura.")
         
+    # Política de descarte e tamanho da fila: valem para a próxima gravação e para a atual
+    def set_record_drop_policy(self, choice):
+        self.record_drop_policy = self.record_drop_policy_options[choice]
+        if self.recorder is not None:
+            self.recorder.configure(drop_policy=self.record_drop_policy)
+
+    def set_record_queue_size(self, choice):
+        self.record_queue_size = self.record_queue_size_options[choice]
+        if self.recorder is not None:
+            self.recorder.configure(queue_size=self.record_queue_size)
+
     def save_webcam_record(self):
         self.webcam_record_frames += 1
-        if self.recording_mode == "video":
-            self.webcam_writer.write(self.current_frame)
-        elif self.recording_mode == "frames":
-            os.makedirs(os.path.join(self.webcam_save_dir, "recorded_frames"), exist_ok=True)
-            cv2.imwrite(os.path.join(self.webcam_save_dir, "recorded_frames", f"frame_{self.webcam_record_frames}.jpg"), 
-                        self.current_frame, [cv2.IMWRITE_JPEG_QUALITY, 60])
-        else:
-            print("Modo de gravação desconhecido")
+        self.recorder.write(self.current_frame)
     
     # Salvar segmentos cortados (video)
     def save_video_segments(self):
         if not self.video_cutpoints:
             messagebox.showwarning("Aviso", "Nenhum ponto de corte marcado!")
             return
+        if self.segment_export is not None:
+            messagebox.showwarning("Aviso", "Uma exportação de segmentos já está em andamento!")
+            return
         
         # Ordenar pontos de corte
         self.video_cutpoints.sort()
         
-        # Adicionar início e fim do vídeo
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        total_duration = self.cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.cap.get(cv2.CAP_PROP_FPS)
-        points = [0] + self.video_cutpoints + [total_duration]
+        # Os cortes são feitos pelo índice (contagem exata de frames e seeks pelos timestamps)
+        if self.video_index is None:
+            messagebox.showwarning("Aviso", "O índice do vídeo ainda está sendo construído. Tente novamente em instantes.")
+            return
+        total_frames = self.video_index.frame_count
         
         # Perguntar modo de salvamento
         save_mode = messagebox.askyesno("Modo de Salvamento", 
@@ -749,53 +1495,32 @@ class VideoImageProcessor:
         if not save_dir:
             return
         
-        # Processar cada segmento
-        for i in range(len(points) - 1):
-            start_time = points[i]
-            end_time = points[i+1]
-            
-            # Configurar posição inicial
-            self.cap.set(cv2.CAP_PROP_POS_MSEC, start_time * 1000)
-            
-            if save_mode:  # Salvar como frames
-                frames_dir = os.path.join(save_dir, f"segment_{i+1}_frames")
-                os.makedirs(frames_dir, exist_ok=True)
-                frame_count = 0
-                
-                while self.cap.get(cv2.CAP_PROP_POS_MSEC) < end_time * 1000:
-                    ret, frame = self.cap.read()
-                    if not ret:
-                        break
-                    
-                    frame_path = os.path.join(frames_dir, f"frame_{frame_count:04d}.jpg")
-                    frame = self.apply_filters_on_video(frame)
-                    if self.is_zoomed():
-                        frame = self.apply_zoom_video(frame)
-                    cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 60])
-                    frame_count += 1
-            
-            else:  # Salvar como vídeo
-                # Obter propriedades do vídeo original
-                fps = self.cap.get(cv2.CAP_PROP_FPS)
-                width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                
-                # Configurar writer
-                output_path = os.path.join(save_dir, f"segment_{i+1}.mp4")
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-                
-                while self.cap.get(cv2.CAP_PROP_POS_MSEC) < end_time * 1000:
-                    ret, frame = self.cap.read()
-                    if not ret:
-                        break
-                    frame = self.apply_filters_on_video(frame)
-                    if self.is_zoomed():
-                        frame = self.apply_zoom_video(frame)
-                    out.write(frame)
-                
-                out.release()
-        
+        # Renderização em processos separados: um por segmento ou uma leitura única do vídeo
+        self.segment_export = SegmentExport(self.current_file, segment_ranges(self.video_cutpoints, total_frames),
+                                            save_dir, save_mode, self.video_filters, self.zoom_rect,
+                                            self.model_path, mode=self.export_mode,
+                                            detect_interval=self.detect_interval,
+                                            batch_size=self.export_batch_size,
+                                            index=self.video_index).start()
+        self.check_segment_export()
+
+    # Processos paralelos (um por segmento) ou uma leitura única do vídeo
+    def set_export_mode(self, choice):
+        self.export_mode = self.export_mode_options[choice]
+
+    # Acompanha a exportação sem bloquear a interface
+    def check_segment_export(self):
+        if not self.segment_export.done():
+            self.root.after(200, self.check_segment_export)
+            return
+
+        export, self.segment_export = self.segment_export, None
+        try:
+            frame_counts = export.result()
+        except Exception as e:
+            messagebox.showerror("Erro", f"Erro ao salvar os segmentos: {e}")
+            return
+        print(f"Segmentos exportados (modo {export.mode}): {frame_counts}")
         messagebox.showinfo("Concluído", "Segmentos salvos com sucesso!")
         self.video_cutpoints = []  # Limpar pontos de corte
      
@@ -805,6 +1530,12 @@ class VideoImageProcessor:
         y1 = self.zoom_rect[2]
         y2 = self.zoom_rect[3]
 
+        # Imagem grande: o recorte é uma vista do memmap, sem cópia
+        if self.large_image is not None:
+            self.large_image = self.large_original = self.large_image.crop((x1, x2, y1, y2))
+            self.show_frame()
+            return
+
         # Aplicando Zoom
         if self.zoomed_frame is not None:
             self.current_frame = self.zoomed_frame[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
@@ -813,29 +1544,12 @@ class VideoImageProcessor:
         
         self.zoomed_frame = self.current_frame.copy()
         self.original_frame = self.zoomed_frame.copy()
+        # O recorte passa a ser a imagem base do histórico
+        self.image_history.reset(self.original_frame)
+        self.update_history_controls()
 
-        # Redimensionar mantendo proporção
-        height, width = self.current_frame.shape[:2]
-        
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-
-        self.ratio = max(width/canvas_width, height/canvas_height)
-        new_width = int(width / self.ratio)
-        new_height = int(height / self.ratio)
-
-        self.image_offset = ((canvas_width - new_width) / 2, (canvas_height - new_height) / 2)
-        
-        frame_resized = cv2.resize(self.current_frame, (new_width, new_height))
-
-        frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-
-        self.photo = ImageTk.PhotoImage(image=Image.fromarray(frame_rgb))
-
-        # Mostrar na canvas
-        self.canvas.delete("all")
-        self.canvas.create_image(canvas_width//2, canvas_height//2, 
-                            image=self.photo, anchor=tk.CENTER)
+        # Mostrar na canvas (redimensionado mantendo proporção)
+        self.show_frame()
     
     # Aplicar zoom e abrir em nova janela (Retorna frame com zoom)
     def apply_zoom_video(self, original_frame):
@@ -844,31 +1558,11 @@ class VideoImageProcessor:
         y1 = self.zoom_rect[2]
         y2 = self.zoom_rect[3]
 
-        # Aplicando Zoom
-        self.zoomed_frame = original_frame[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
-
-        # Redimensionar mantendo proporção
-        height, width = self.zoomed_frame.shape[:2]
-        
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-
-        self.ratio = max(width/canvas_width, height/canvas_height)
-        new_width = int(width / self.ratio)
-        new_height = int(height / self.ratio)
-
-        self.image_offset = ((canvas_width - new_width) / 2, (canvas_height - new_height) / 2)
-        
-        frame_resized = cv2.resize(self.zoomed_frame, (new_width, new_height))
-
-        frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
+        # zoom_rect está em coordenadas do frame original
+        x1, x2, y1, y2 = [int(round(v * self.preview_scale)) for v in (x1, x2, y1, y2)]
 
-        self.photo = ImageTk.PhotoImage(image=Image.fromarray(frame_rgb))
-
-        # Mostrar na canvas
-        self.canvas.delete("all")
-        self.canvas.create_image(canvas_width//2, canvas_height//2, 
-                            image=self.photo, anchor=tk.CENTER)
+        # Aplicando Zoom (a exibição fica com show_frame, chamado em seguida)
+        self.zoomed_frame = original_frame[min(y1,y2):max(y1,y2), min(x1,x2):max(x1,x2)]
 
         return self.zoomed_frame.copy()
 
@@ -885,198 +1579,177 @@ class VideoImageProcessor:
     # -------- Funções de filtros ---------
     def apply_blur(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                self.current_frame = cv2.GaussianBlur(self.current_frame, (5,5), 0)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('blur')
+            elif self.current_frame is not None:
+                self.apply_image_filter('blur')
                 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('blur')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
 
     
     def apply_sharpen(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-                self.current_frame = cv2.filter2D(self.current_frame, -1, kernel)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('sharpen')
+            elif self.current_frame is not None:
+                self.apply_image_filter('sharpen')
                 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('sharpen')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
     def apply_emboss(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                kernel = np.array([[-2,-1,0], [-1,1,1], [0,1,2]])
-                self.current_frame = cv2.filter2D(self.current_frame, -1, kernel)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('emboss')
+            elif self.current_frame is not None:
+                self.apply_image_filter('emboss')
         
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('emboss')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
     def apply_laplacian(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                self.current_frame = cv2.Laplacian(self.current_frame, cv2.CV_64F).astype(np.uint8)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('laplacian')
+            elif self.current_frame is not None:
+                self.apply_image_filter('laplacian')
 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 # Loop para ler todos os quadros enquanto o vídeo está sendo processado
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('laplacian')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
     def apply_canny(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                self.current_frame = cv2.Canny(self.current_frame, 100, 200)
-                self.current_frame = cv2.cvtColor(self.current_frame, cv2.COLOR_GRAY2BGR)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('canny')
+            elif self.current_frame is not None:
+                self.apply_image_filter('canny')
                 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('canny')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
     def apply_sobel(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                grad_x = cv2.Sobel(self.current_frame, cv2.CV_64F, 1, 0, ksize=3)
-                grad_y = cv2.Sobel(self.current_frame, cv2.CV_64F, 0, 1, ksize=3)
-                abs_grad_x = cv2.convertScaleAbs(grad_x)
-                abs_grad_y = cv2.convertScaleAbs(grad_y)
-                self.current_frame = cv2.addWeighted(abs_grad_x, 0.5, abs_grad_y, 0.5, 0)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('sobel')
+            elif self.current_frame is not None:
+                self.apply_image_filter('sobel')
                 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('sobel')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
     # --------- Funções de cor -----------
     def convert_grayscale(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                gray = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2GRAY)
-                self.current_frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('gray')
+            elif self.current_frame is not None:
+                self.apply_image_filter('gray')
 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('gray')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
     def convert_binary(self):
         if self.mode_var.get() == 'image':
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                gray = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2GRAY)
-                _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
-                self.current_frame = cv2.cvtColor(binary, cv2.COLOR_GRAY2BGR)
-                self.show_frame()
+            if self.large_image is not None:
+                self.apply_large_image_filter('binary')
+            elif self.current_frame is not None:
+                self.apply_image_filter('binary')
 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()
                 self.video_filters.append('binary')
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
     def restore_color(self):
         if self.mode_var.get() == 'image':
-            if self.original_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame
-                self.current_frame = self.original_frame.copy()
+            if self.large_image is not None:
+                self.large_image = self.large_original
                 self.show_frame()
+            elif self.original_frame is not None:
+                # Volta à imagem original mantendo as etapas para "Refazer"
+                self.current_frame = self.image_history.seek(0)
+                self.show_frame()
+                self.update_history_controls()
 
         elif self.mode_var.get() == 'video' or self.mode_var.get() == 'webcam':
-            if self.cap is not None:
+            if self.cap is not None or self.multi_stream is not None:
                 self.video_filters.clear()
-                if self.is_paused:
-                    self.update_video_frame()
+                self.refresh_paused_frame()
     
 
     def detect_objects(self):
-        if self.mode_var.get() == 'image':  # Modo imagem
-            if self.current_frame is not None:
-                if self.processing_mode.get() == 'independent':
-                    self.current_frame = self.original_frame.copy()  # Restaurar o frame original
-                    
-                # Realizar detecção de objetos no frame atual
-                results = self.model(self.current_frame, conf=0.5)  # Ajuste a confiança conforme necessário
-                annotated_frame = results[0].plot()  # Anotar o frame com os resultados
-                
-                self.current_frame = annotated_frame  # Atualizar o frame atual com as anotações
-                self.show_frame()  # Exibir o frame anotado
+        # O modelo é carregado em segundo plano depois que a janela abre
+        if self.model is None:
+            if self.model_load_result is not None:
+                # O carregamento falhou: tentar de novo
+                self.start_model_loading()
+            messagebox.showinfo("Detecção", "O modelo de detecção ainda está sendo carregado. Tente novamente em instantes.")
+            return
 
-        elif self.mode_var.get() == 'video':  # Modo vídeo
-            if self.cap is not None:
+        if self.mode_var.get() == 'image':  # Modo imagem
+            if self.large_image is not None:
+                messagebox.showerror("Erro", "A detecção não está disponível para imagens grandes (processamento em blocos).")
+            elif self.current_frame is not None:
+                # Realizar detecção de objetos no frame atual (como uma etapa do histórico)
+                self.apply_image_filter('detect_objects', lambda frame: self.model(frame, conf=0.5)[0].plot())
+
+        elif self.mode_var.get() == 'video' or self.multi_stream is not None:  # Modo vídeo ou várias fontes
+            if self.cap is not None or self.multi_stream is not None:
                 if self.processing_mode.get() == 'independent':
                     self.video_filters.clear()  # Limpar filtros aplicados ao vídeo
                 
                 self.video_filters.append('detect_objects')  # Adicionar a detecção como um filtro
-                if self.is_paused:
-                    # Atualizar o frame pausado com a detecção
-                    if self.current_frame is not None:
-                        results = self.model(self.current_frame, conf=0.5)
-                        annotated_frame = results[0].plot()
-                        self.current_frame = annotated_frame
-                        self.update_video_frame()  # Atualizar exibição com o frame anotado
+                # Atualizar o frame pausado com a detecção
+                self.refresh_paused_frame()
 
 
     # Controle de exclusão do objeto
     def __del__(self):
-        if self.cap is not None:
-            self.cap.release()
+        self.release_capture()
         cv2.destroyAllWindows()
 
-def main():
+def main(startup_begin=None):
     root = ctk.CTk()
     app = VideoImageProcessor(root)
+    # Tempo de montagem da janela; o dos imports é medido à parte (benchmark.py --only startup)
+    if startup_begin is not None:
+        root.after_idle(lambda: print(f"Interface pronta em {time.perf_counter() - startup_begin:.2f} s"))
     root.mainloop()
+    # Gravar o cache de detecções e liberar o vídeo ao fechar a janela
+    app.release_capture()
+    app.dump_perf_log()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(time.perf_counter())
\ No newline at end of file
@@ -0,0 +1,255 @@
+import math
+import threading
+import time
+import cv2
+import numpy as np
+from filters import compile_filter_chain
+from detection import Detector, draw_detections
+from display import fit_to_canvas
+from perf import PerfMonitor
+from video_io import FileCapture, WebcamCapture
+# Várias fontes ao mesmo tempo (webcams, arquivos ou ambos).
+# Cada fonte tem uma thread de captura (só o frame mais recente) e uma thread que aplica a
+# cadeia de filtros. A detecção de todas as fontes passa por um único modelo, em uma
+# única thread (BatchedDetection): os pedidos que chegam juntos viram um lote, uma
+# inferência para vários streams. O modelo é carregado uma vez e o custo fixo de cada
+# chamada é dividido entre os streams, em vez de um modelo por fonte.
+# Não importa tkinter: pode ser usado sem display.
+
+BATCH_WAIT_SECONDS = 0.01  # espera máxima pelos demais streams para completar o lote
+
+
+# Um pedido de detecção de um stream, respondido pela thread do lote
+class _Request:
+    def __init__(self, frame):
+        self.frame = frame
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchedDetection:
+    def __init__(self, detector=None, max_wait=BATCH_WAIT_SECONDS):
+        self.detector = detector   # detection.Detector compartilhado (None: modelo ainda não carregado)
+        self.max_wait = max_wait
+        self.expected = 1          # streams que podem pedir detecção ao mesmo tempo
+        self.requests = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        # Contadores
+        self.batches = 0
+        self.frames_detected = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="BatchedDetection", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    # Chamado pelas threads dos streams: bloqueia até o lote com este frame ser processado
+    def detect(self, frame):
+        if self.detector is None:
+            raise ValueError("Modelo de detecção não carregado.")
+        request = _Request(frame)
+        with self.condition:
+            if not self.running:
+                raise ValueError("Detecção encerrada.")
+            self.requests.append(request)
+            self.condition.notify_all()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self):
+        with self.condition:
+            return {
+                'batches': self.batches,
+                'frames_detected': self.frames_detected,
+                'mean_batch_size': self.frames_detected / self.batches if self.batches else 0.0,
+            }
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.requests or not self.running)
+                if not self.running:
+                    for request in self.requests:
+                        request.error = ValueError("Detecção encerrada.")
+                        request.done.set()
+                    self.requests = []
+                    return
+                # Aguardar os demais streams por pouco tempo para formar o lote
+                deadline = time.perf_counter() + self.max_wait
+                while self.running and len(self.requests) < self.expected:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch, self.requests = self.requests, []
+
+            try:
+                results = self.detector.detect_batch([request.frame for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            with self.condition:
+                self.batches += 1
+                self.frames_detected += len(batch)
+            for request in batch:
+                request.done.set()
+
+
+# Detector visto pela cadeia de filtros de um stream (mesma interface de detection.Detector
+# usada por FilterPipeline); a inferência é feita pelo BatchedDetection compartilhado
+class StreamDetector:
+    def __init__(self, shared):
+        self.shared = shared
+        self.frame_index = None
+
+    def __call__(self, frame, source=""):
+        detections = self.shared.detect(frame)
+        return draw_detections(frame, detections, self.shared.detector.names)
+
+    def reset(self):
+        pass
+
+
+# Uma fonte: captura + cadeia de filtros em uma thread. filter_names é lido a cada frame
+# (a lista de filtros da interface, alterada pelos botões)
+class Stream:
+    def __init__(self, name, capture, filter_names, shared_detection):
+        self.name = name
+        self.capture = capture
+        self.filter_names = filter_names
+        self.detector = StreamDetector(shared_detection)
+        self.monitor = PerfMonitor()  # fps e tempos deste stream
+        self.output = None            # último frame processado
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        self.capture.start()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"Stream {self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        self.capture.stop()
+
+    def latest(self):
+        with self.lock:
+            return self.output
+
+    def _run(self):
+        pipeline = None
+        sequence = 0
+        last_error = None  # o mesmo erro em todos os frames é mostrado uma vez
+        while self.running:
+            item = self.capture.wait_latest(sequence)
+            if item is None:
+                continue
+            sequence, captured_at, frame = item
+            filter_names = list(self.filter_names)
+            try:
+                if pipeline is None or not pipeline.matches(filter_names, self.detector):
+                    pipeline = compile_filter_chain(filter_names, self.detector)
+                with self.monitor.measure("filtros"):
+                    processed = pipeline(frame)
+            except Exception as e:
+                if not self.running:
+                    return
+                if str(e) != last_error:
+                    print(f"Erro ao aplicar filtros em {self.name}: {e}")
+                    last_error = str(e)
+                processed = frame
+            with self.lock:
+                self.output = processed
+            self.monitor.record("captura→saída", time.perf_counter() - captured_at)
+            self.monitor.frame_presented()
+
+
+# sources: índices de webcam (int) e/ou caminhos de vídeo
+class MultiStream:
+    def __init__(self, sources, filter_names, model=None, webcam_format=(None, None, None, None)):
+        self.shared_detection = BatchedDetection()
+        self.set_model(model)
+        self.streams = []
+        for source in sources:
+            if isinstance(source, int):
+                capture, name = WebcamCapture(source, *webcam_format), f"webcam {source}"
+            else:
+                capture, name = FileCapture(source), source.replace("\\", "/").rsplit("/", 1)[-1]
+            self.streams.append(Stream(name, capture, filter_names, self.shared_detection))
+        self.shared_detection.expected = max(1, len(self.streams))
+
+    def set_model(self, model, conf=0.5):
+        self.shared_detection.detector = Detector(model, conf) if model is not None else None
+
+    # As fontes que não abrem são encerradas e o erro é repassado
+    def start(self):
+        self.shared_detection.start()
+        try:
+            for stream in self.streams:
+                stream.start()
+        except Exception:
+            self.stop()
+            raise
+        return self
+
+    def stop(self):
+        # Os streams param antes da detecção, para não pedirem lotes que não virão
+        for stream in self.streams:
+            stream.running = False
+        self.shared_detection.stop()
+        for stream in self.streams:
+            stream.stop()
+
+    # [(nome, último frame ou None, fps)]
+    def outputs(self):
+        return [(stream.name, stream.latest(), stream.monitor.fps()) for stream in self.streams]
+
+    def stats(self):
+        stats = {stream.name: {'fps': round(stream.monitor.fps(), 1), **stream.capture.stats()}
+                 for stream in self.streams}
+        stats['detecção'] = self.shared_detection.stats()
+        return stats
+
+
+# Mosaico dos streams em uma imagem size (largura, altura), com nome e fps de cada um
+def compose_grid(outputs, size):
+    width, height = size
+    grid = np.zeros((height, width, 3), dtype=np.uint8)
+    if not outputs:
+        return grid
+    columns = math.ceil(math.sqrt(len(outputs)))
+    rows = math.ceil(len(outputs) / columns)
+    cell_width, cell_height = width // columns, height // rows
+    for i, (name, frame, fps) in enumerate(outputs):
+        x0, y0 = (i % columns) * cell_width, (i // columns) * cell_height
+        if frame is not None and cell_width > 0 and cell_height > 0:
+            _, (new_width, new_height), (dx, dy) = fit_to_canvas(frame.shape, cell_width, cell_height)
+            x, y = x0 + int(dx), y0 + int(dy)
+            grid[y:y + new_height, x:x + new_width] = cv2.resize(frame, (new_width, new_height),
+                                                                 interpolation=cv2.INTER_LINEAR)
+        cv2.putText(grid, f"{name}  {fps:.1f} fps", (x0 + 8, y0 + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                    (0, 255, 0), 1, cv2.LINE_AA)
+    return grid
@@ -0,0 +1,100 @@
+import csv
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+# Medição de desempenho por etapa (decodificação, cada filtro, detecção, zoom, exibição).
+# Mantém as últimas amostras de cada etapa para p50/p95 e a taxa de frames apresentados;
+# snapshot() guarda o resumo atual para o CSV gravado no fim da sessão.
+# Não importa tkinter: a leitura de vídeo registra tempos de outra thread.
+
+PERF_LOG_DIR = os.path.join(os.path.expanduser("~"), ".cache", "processador_imagens", "perf")
+
+
+class PerfMonitor:
+    def __init__(self, window=240, fps_window_seconds=2.0):
+        self.window = window
+        self.fps_window_seconds = fps_window_seconds
+        self.samples = {}          # etapa -> últimos tempos (s)
+        self.counts = {}           # etapa -> total de amostras na sessão
+        self.presented = deque()   # instantes em que um frame foi apresentado
+        self.history = []          # linhas do CSV (ver snapshot)
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+                self.counts[stage] = 0
+            samples.append(seconds)
+            self.counts[stage] += 1
+
+    # Uso: with monitor.measure('etapa'): ...
+    def measure(self, stage):
+        return _Measure(self, stage)
+
+    def frame_presented(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self.lock:
+            self.presented.append(now)
+            while len(self.presented) > 2 and now - self.presented[0] > self.fps_window_seconds:
+                self.presented.popleft()
+
+    def fps(self):
+        with self.lock:
+            if len(self.presented) < 2:
+                return 0.0
+            elapsed = self.presented[-1] - self.presented[0]
+            return (len(self.presented) - 1) / elapsed if elapsed > 0 else 0.0
+
+    # {etapa: (p50 ms, p95 ms, amostras na sessão)}, na ordem em que as etapas apareceram
+    def summary(self):
+        with self.lock:
+            items = [(stage, np.asarray(samples), self.counts[stage]) for stage, samples in self.samples.items()]
+        summary = {}
+        for stage, samples, count in items:
+            if len(samples):
+                p50, p95 = np.percentile(samples, (50, 95)) * 1000.0
+                summary[stage] = (float(p50), float(p95), count)
+        return summary
+
+    def format_lines(self):
+        lines = [f"FPS {self.fps():5.1f}"]
+        for stage, (p50, p95, _) in self.summary().items():
+            lines.append(f"{stage:<22} p50 {p50:6.1f}  p95 {p95:6.1f} ms")
+        return lines
+
+    # Guarda o resumo atual (uma linha por etapa) para o CSV
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        fps = self.fps()
+        for stage, (p50, p95, count) in self.summary().items():
+            self.history.append((round(elapsed, 3), stage, count, round(p50, 3), round(p95, 3), round(fps, 2)))
+
+    def dump_csv(self, path=None, log_dir=PERF_LOG_DIR):
+        self.snapshot()
+        if path is None:
+            os.makedirs(log_dir, exist_ok=True)
+            path = os.path.join(log_dir, time.strftime("session_%Y-%m-%d_%H-%M-%S.csv"))
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("tempo_s", "etapa", "amostras", "p50_ms", "p95_ms", "fps"))
+            writer.writerows(self.history)
+        return path
+
+
+class _Measure:
+    def __init__(self, monitor, stage):
+        self.monitor = monitor
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.monitor.record(self.stage, time.perf_counter() - self.start)
+        return False
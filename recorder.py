@@ -0,0 +1,137 @@
+import os
+import threading
+from collections import deque
+import cv2
+# Gravação assíncrona: a codificação e a escrita em disco acontecem em uma thread própria,
+# para que a captura da webcam nunca espere pelo encoder ou pelo disco.
+
+DROP_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+# Fila limitada de frames consumida por uma thread de escrita.
+# Fila cheia, conforme drop_policy:
+#  - 'block': write() espera haver espaço (não perde frames, mas pode atrasar a captura);
+#  - 'drop_oldest': descarta o frame mais antigo da fila e aceita o novo;
+#  - 'drop_newest': descarta o frame novo.
+class AsyncRecorder:
+    def __init__(self, output_path, mode="video", fps=30.0, size=(640, 480), queue_size=64,
+                 drop_policy='drop_oldest', jpeg_quality=60):
+        if mode not in ("video", "frames"):
+            raise ValueError(f"Modo de gravação desconhecido: {mode}")
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Política de descarte desconhecida: {drop_policy}")
+        self.output_path = output_path  # arquivo .mp4 (modo "video") ou pasta (modo "frames")
+        self.mode = mode
+        self.fps = fps
+        self.size = size
+        self.queue_size = max(1, int(queue_size))
+        self.drop_policy = drop_policy
+        self.jpeg_quality = jpeg_quality
+
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.writer = None
+
+        # Contadores
+        self.frames_received = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.max_queue_depth = 0
+
+    def start(self):
+        if self.mode == "video":
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            self.writer = cv2.VideoWriter(self.output_path, fourcc, self.fps, self.size)
+        else:
+            # Criar a pasta uma única vez, e não a cada frame
+            os.makedirs(self.output_path, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="AsyncRecorder", daemon=True)
+        self.thread.start()
+        return self
+
+    # Muda o tamanho da fila e/ou a política de descarte, também durante a gravação
+    def configure(self, queue_size=None, drop_policy=None):
+        if drop_policy is not None and drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Política de descarte desconhecida: {drop_policy}")
+        with self.condition:
+            if queue_size is not None:
+                self.queue_size = max(1, int(queue_size))
+                # Fila maior que o novo limite: os mais antigos saem, como em 'drop_oldest'
+                while len(self.queue) > self.queue_size and (drop_policy or self.drop_policy) != 'block':
+                    self.queue.popleft()
+                    self.frames_dropped += 1
+            if drop_policy is not None:
+                self.drop_policy = drop_policy
+            self.condition.notify_all()
+
+    # Enfileira um frame; devolve False se ele foi descartado
+    def write(self, frame):
+        with self.condition:
+            if not self.running:
+                return False
+            self.frames_received += 1
+            if len(self.queue) >= self.queue_size:
+                if self.drop_policy == 'drop_newest':
+                    self.frames_dropped += 1
+                    return False
+                if self.drop_policy == 'drop_oldest':
+                    self.queue.popleft()
+                    self.frames_dropped += 1
+                else:
+                    while self.running and len(self.queue) >= self.queue_size:
+                        self.condition.wait()
+                    if not self.running:
+                        return False
+            self.queue.append(frame)
+            self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+            self.condition.notify_all()
+            return True
+
+    # Encerra a gravação depois de escrever os frames que ainda estão na fila
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+    def stats(self):
+        with self.condition:
+            return {
+                'queue_depth': len(self.queue),
+                'max_queue_depth': self.max_queue_depth,
+                'queue_size': self.queue_size,
+                'frames_received': self.frames_received,
+                'frames_written': self.frames_written,
+                'frames_dropped': self.frames_dropped,
+            }
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                frame = self.queue.popleft()
+                self.condition.notify_all()
+
+            try:
+                self._write_frame(frame)
+            except Exception as e:
+                print(f"Erro ao gravar frame: {e}")
+
+    def _write_frame(self, frame):
+        if self.mode == "video":
+            self.writer.write(frame)
+        else:
+            frame_path = os.path.join(self.output_path, f"frame_{self.frames_written + 1}.jpg")
+            cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        self.frames_written += 1
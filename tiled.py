@@ -0,0 +1,227 @@
+import os
+import tempfile
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+from filters import DETECT_FILTER, compile_filter_chain
+# Imagens muito grandes no modo imagem (ex.: digitalizações de 20k x 20k).
+# A imagem decodificada e cada resultado de filtro ficam em arquivos temporários mapeados
+# em memória (np.memmap): só as páginas em uso ocupam RAM, e o sistema as descarta quando
+# precisa. Os filtros rodam bloco a bloco, em várias threads (o OpenCV libera o GIL), com
+# uma borda extra (halo) lida dos blocos vizinhos para que o resultado seja o mesmo da
+# imagem inteira. A exibição lê só os blocos dentro da região visível, já reduzidos.
+#
+# Na abertura, os formatos sem compressão (TIFF sem compressão, BMP, PPM/PGM) são lidos
+# direto do arquivo, faixa a faixa, sem passar a imagem inteira pela memória. Os formatos
+# comprimidos (JPEG, PNG, TIFF comprimido, WebP) não têm leitura parcial no OpenCV nem no
+# PIL: a imagem é decodificada inteira uma vez (pico de largura x altura x 3 bytes, ~1.2 GB
+# para 20k x 20k) e copiada para o memmap. Depois da abertura, todo o processamento fica
+# limitado aos blocos em uso.
+#
+# Não importa tkinter: pode ser usado sem display.
+
+LARGE_IMAGE_PIXELS = 50_000_000  # acima disso, open_image usa o processamento em blocos
+TILE_SIZE = 1024
+SCRATCH_DIR = os.path.join(tempfile.gettempdir(), "processador_imagens")
+
+# Pixels vizinhos de que cada filtro precisa de cada lado (raio do kernel)
+FILTER_HALO = {
+    'blur': 2,        # Gaussiano 5x5
+    'sharpen': 1,
+    'emboss': 1,
+    'laplacian': 1,
+    'sobel': 1,
+    'gray': 0,
+    'binary': 0,
+    # Sobel 3x3 + supressão de não máximos; a histerese segue bordas fracas sem limite de
+    # distância, então uma borda que só se liga a uma forte a mais de 32 px do bloco pode diferir
+    'canny': 32,
+}
+
+
+# Só o cabeçalho é lido. O limite anti "decompression bomb" do PIL recusaria justamente
+# as imagens grandes, então fica desligado durante a leitura
+def image_size(path):
+    max_pixels = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+def is_large_image(path, max_pixels=LARGE_IMAGE_PIXELS):
+    size = image_size(path)
+    return size is not None and size[0] * size[1] > max_pixels
+
+
+# Layout em disco de cada "rawmode" do PIL: (canais, ordem dos canais para BGR)
+RAW_MODES = {
+    'RGB': (3, [2, 1, 0]),
+    'BGR': (3, [0, 1, 2]),
+    'L': (1, [0, 0, 0]),
+}
+
+
+# Blocos do arquivo que são pixels sem compressão, como o PIL os descreve (Image.tile):
+# [(x0, y0, x1, y1, offset, rawmode, stride, ystep)], ou None se algum bloco for comprimido
+def raw_tiles(path):
+    max_pixels = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(path) as image:
+            tiles = list(image.tile)
+    except Exception:
+        return None
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+    result = []
+    for codec_name, (x0, y0, x1, y1), offset, args in tiles:
+        rawmode, stride, ystep = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+        if codec_name != 'raw' or rawmode not in RAW_MODES:
+            return None
+        result.append((x0, y0, x1, y1, offset, rawmode, stride, ystep))
+    return result or None
+
+
+# Halo de uma cadeia: os raios se somam, estágio após estágio
+def chain_halo(filter_names):
+    if DETECT_FILTER in filter_names:
+        raise ValueError("A detecção não está disponível no processamento em blocos.")
+    return sum(FILTER_HALO[name] for name in filter_names)
+
+
+def _remove_scratch(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Imagem BGR uint8 (altura, largura, 3) em um memmap. crop() devolve uma vista sem cópia,
+# que mantém o arquivo de origem vivo; o arquivo temporário é apagado quando nenhuma
+# imagem o referencia mais.
+class TiledImage:
+    def __init__(self, array, parent=None):
+        self.array = array
+        self.parent = parent
+        self._view = None  # (chave, frame) da última região exibida
+
+    @classmethod
+    def create(cls, shape, scratch_dir=SCRATCH_DIR):
+        os.makedirs(scratch_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="blocos_", suffix=".dat", dir=scratch_dir)
+        os.close(fd)
+        image = cls(np.memmap(path, dtype=np.uint8, mode="w+", shape=tuple(shape)))
+        weakref.finalize(image, _remove_scratch, path)
+        return image
+
+    # Sem compressão, as faixas são copiadas do arquivo (mapeado em memória) para o memmap.
+    # Nos demais formatos o arquivo é decodificado uma vez e copiado por faixas; depois
+    # disso a imagem decodificada é liberada
+    @classmethod
+    def open(cls, path, scratch_dir=SCRATCH_DIR):
+        tiles = raw_tiles(path)
+        if tiles is not None:
+            return cls._open_raw(path, tiles, scratch_dir)
+        frame = cv2.imread(path)
+        if frame is None:
+            raise ValueError("A imagem não foi carregada corretamente.")
+        image = cls.create(frame.shape, scratch_dir)
+        for y in range(0, frame.shape[0], TILE_SIZE):
+            image.array[y:y + TILE_SIZE] = frame[y:y + TILE_SIZE]
+        del frame
+        image.array.flush()
+        return image
+
+    @classmethod
+    def _open_raw(cls, path, tiles, scratch_dir=SCRATCH_DIR):
+        width, height = image_size(path)
+        image = cls.create((height, width, 3), scratch_dir)
+        for x0, y0, x1, y1, offset, rawmode, stride, ystep in tiles:
+            channels, order = RAW_MODES[rawmode]
+            rows, row_bytes = y1 - y0, (x1 - x0) * channels
+            stride = stride or row_bytes
+            source = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(rows, stride))
+            if ystep < 0:
+                source = source[::-1]  # linhas de baixo para cima (BMP)
+            source = source[:, :row_bytes].reshape(rows, x1 - x0, channels)
+            for y in range(0, rows, TILE_SIZE):
+                image.array[y0 + y:y0 + y + TILE_SIZE, x0:x1] = source[y:y + TILE_SIZE][:, :, order]
+            del source
+        image.array.flush()
+        return image
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def tiles(self, tile_size=TILE_SIZE):
+        height, width = self.shape[:2]
+        for y in range(0, height, tile_size):
+            for x in range(0, width, tile_size):
+                yield y, min(y + tile_size, height), x, min(x + tile_size, width)
+
+    # Mesma convenção de zoom_rect: (x1, x2, y1, y2), em qualquer ordem
+    def crop(self, rect):
+        x1, x2, y1, y2 = rect
+        height, width = self.shape[:2]
+        x1, x2 = sorted((min(max(0, x1), width), min(max(0, x2), width)))
+        y1, y2 = sorted((min(max(0, y1), height), min(max(0, y2), height)))
+        return TiledImage(self.array[y1:y2, x1:x2], parent=self.parent or self)
+
+    # Cópia em memória (ROI)
+    def to_array(self):
+        return np.array(self.array)
+
+    # Aplica a cadeia bloco a bloco em threads; o resultado vai para um novo memmap
+    def apply(self, filter_names, tile_size=TILE_SIZE, workers=None, scratch_dir=SCRATCH_DIR):
+        pipeline = compile_filter_chain(filter_names)
+        halo = chain_halo(filter_names)
+        height, width = self.shape[:2]
+        output = TiledImage.create(self.shape, scratch_dir)
+
+        def process(tile):
+            y0, y1, x0, x1 = tile
+            sy0, sy1 = max(0, y0 - halo), min(height, y1 + halo)
+            sx0, sx1 = max(0, x0 - halo), min(width, x1 + halo)
+            processed = pipeline(np.ascontiguousarray(self.array[sy0:sy1, sx0:sx1]))
+            output.array[y0:y1, x0:x1] = processed[y0 - sy0:y1 - sy0, x0 - sx0:x1 - sx0]
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            list(executor.map(process, self.tiles(tile_size)))
+        output.array.flush()
+        return output
+
+    # A imagem inteira reduzida para size (largura, altura), lendo bloco a bloco. Em reduções
+    # grandes, só uma a cada "step" linhas/colunas é lida do disco antes do INTER_AREA.
+    def render(self, size, tile_size=TILE_SIZE, workers=None):
+        width, height = size
+        key = (width, height)
+        if self._view is not None and self._view[0] == key:
+            return self._view[1]
+        image_height, image_width = self.shape[:2]
+        scale_x, scale_y = width / image_width, height / image_height
+        step = max(1, int(1 / max(scale_x, scale_y)) // 2)
+        view = np.empty((height, width, 3), dtype=np.uint8)
+
+        def render_tile(tile):
+            y0, y1, x0, x1 = tile
+            # Limites arredondados: blocos vizinhos compartilham a mesma linha/coluna de divisa
+            dy0, dy1 = round(y0 * scale_y), round(y1 * scale_y)
+            dx0, dx1 = round(x0 * scale_x), round(x1 * scale_x)
+            if dy1 <= dy0 or dx1 <= dx0:
+                return
+            source = self.array[y0:y1:step, x0:x1:step]
+            view[dy0:dy1, dx0:dx1] = cv2.resize(np.ascontiguousarray(source), (dx1 - dx0, dy1 - dy0),
+                                                interpolation=cv2.INTER_AREA)
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            list(executor.map(render_tile, self.tiles(tile_size)))
+        self._view = (key, view)
+        return view
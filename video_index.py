@@ -0,0 +1,129 @@
+import bisect
+import hashlib
+import os
+import cv2
+import numpy as np
+from video_io import scan_keyframes
+# Índice persistente por vídeo: número do frame -> timestamp (ms) e lista de keyframes.
+# Construído uma única vez (em segundo plano pela interface) e guardado em disco,
+# identificado pelo caminho, tamanho e data de modificação do arquivo.
+
+INDEX_VERSION = 1
+INDEX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "processador_imagens", "video_index")
+
+
+class VideoIndex:
+    def __init__(self, pts_ms, keyframes, fps):
+        self.pts_ms = np.asarray(pts_ms, dtype=np.float64)
+        self.keyframes = [int(k) for k in keyframes]
+        self.fps = float(fps)
+
+    @property
+    def frame_count(self):
+        return len(self.pts_ms)
+
+    # Timestamp (ms) de um frame
+    def time_of(self, frame_index):
+        frame_index = min(max(0, int(frame_index)), self.frame_count - 1)
+        return float(self.pts_ms[frame_index])
+
+    # Frame com o timestamp "msec" (tolerância de meio ms), ou None
+    def frame_at(self, msec):
+        frame_index = int(np.searchsorted(self.pts_ms, msec + 0.5, side='right')) - 1
+        if frame_index < 0 or abs(self.pts_ms[frame_index] - msec) > 0.5:
+            return None
+        return frame_index
+
+    def keyframe_before(self, frame_index):
+        index = bisect.bisect_right(self.keyframes, frame_index) - 1
+        return self.keyframes[index] if index >= 0 else 0
+
+    # Avança o cap até o frame "frame_index" com grab(): depois disso, retrieve() devolve
+    # esse frame. O seek do OpenCV converte o número do frame em timestamp pelo fps nominal
+    # e, em vídeos de fps variável, cai em outro frame. Aqui o seek é pedido para o
+    # timestamp do frame no índice, o frame em que ele caiu é identificado pelo timestamp,
+    # e o resto do caminho é feito com grab(). Se cair depois do alvo, tenta a partir dos
+    # keyframes anteriores e, por fim, do início. Devolve False se o vídeo terminar antes.
+    def seek(self, cap, frame_index):
+        frame_index = max(0, int(frame_index))
+        if frame_index >= self.frame_count:
+            return False
+        fps = self.fps or 30.0
+        starts = [frame_index]
+        keyframe = self.keyframe_before(frame_index)
+        while keyframe > 0 and len(starts) < 3:
+            starts.append(keyframe)
+            keyframe = self.keyframe_before(keyframe - 1)
+        landed = None
+        for start in starts:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(self.pts_ms[start] * fps / 1000.0))
+            if not cap.grab():
+                continue
+            landed = self.frame_at(cap.get(cv2.CAP_PROP_POS_MSEC))
+            if landed is not None and landed <= frame_index:
+                break
+            landed = None
+        if landed is None:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            if not cap.grab():
+                return False
+            landed = 0
+        for _ in range(frame_index - landed):
+            if not cap.grab():
+                return False
+        return True
+
+    # Varre o vídeo: keyframes pelos pacotes (sem decodificar) e timestamps com grab(),
+    # que decodifica mas não converte os frames para BGR
+    @classmethod
+    def build(cls, filename):
+        keyframes = scan_keyframes(filename)
+        cap = cv2.VideoCapture(filename)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"Não foi possível abrir o vídeo {filename}")
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            pts_ms = []
+            while cap.grab():
+                pts_ms.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+        finally:
+            cap.release()
+        return cls(pts_ms, keyframes, fps)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, version=INDEX_VERSION, pts_ms=self.pts_ms,
+                            keyframes=np.asarray(self.keyframes, dtype=np.int64), fps=self.fps)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != INDEX_VERSION:
+                return None
+            return cls(data['pts_ms'], data['keyframes'], float(data['fps']))
+
+    @classmethod
+    def load_or_build(cls, filename, cache_dir=INDEX_CACHE_DIR):
+        path = index_cache_path(filename, cache_dir)
+        if os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if index is not None:
+                    return index
+            except Exception as e:
+                print(f"Índice de vídeo inválido, reconstruindo: {e}")
+        index = cls.build(filename)
+        try:
+            index.save(path)
+        except OSError as e:
+            print(f"Não foi possível salvar o índice do vídeo: {e}")
+        return index
+
+
+# Nome do arquivo de cache: muda se o vídeo for movido, alterado ou substituído
+def index_cache_path(filename, cache_dir=INDEX_CACHE_DIR):
+    stat = os.stat(filename)
+    key = f"{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npz")
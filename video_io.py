@@ -0,0 +1,560 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict, deque
+import cv2
+# Leitura de vídeo fora da thread da interface.
+# Não importa tkinter: também é usado pelas ferramentas sem interface.
+
+# O seek do OpenCV (backend FFmpeg) volta ao keyframe anterior a "alvo - 16" e decodifica
+# até o alvo. Um seek para "keyframe + 16" cai exatamente no keyframe; um seek para o
+# próprio keyframe volta um GOP inteiro.
+SEEK_PREROLL_FRAMES = 16
+
+# Saltos para frente até este tamanho avançam com grab() (decodifica sem converter/copiar
+# o frame); saltos maiores usam seek
+MAX_GRAB_GAP = 64
+
+
+# Posiciona o cap no frame "frame_index". Com o índice (video_index.VideoIndex), o seek é
+# exato também em vídeos de fps variável e o frame já fica lido com grab(): devolve True e
+# o próximo frame vem de retrieve() (None se o vídeo terminar antes). Sem o índice, seek do
+# OpenCV (pelo fps nominal) e devolve False: o próximo frame vem de read().
+def seek_capture(cap, frame_index, index=None):
+    if index is not None:
+        return True if index.seek(cap, frame_index) else None
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    return False
+
+
+# Lista os frames-chave do vídeo lendo os pacotes sem decodificá-los (modo "raw" do FFmpeg)
+def scan_keyframes(filename):
+    cap = cv2.VideoCapture(filename, cv2.CAP_FFMPEG)
+    keyframes = []
+    try:
+        if not cap.isOpened() or not cap.set(cv2.CAP_PROP_FORMAT, -1):
+            return keyframes
+        index = 0
+        while cap.grab():
+            if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(index)
+            index += 1
+    finally:
+        cap.release()
+    return keyframes
+
+
+# Decodifica o vídeo em uma thread produtora e guarda os frames prontos em um buffer
+# circular limitado. A interface apenas retira frames do buffer (read), sem bloquear.
+#
+# No modo reverso, em vez de um seek por frame (que no H.264 decodifica desde o keyframe
+# anterior a cada frame), decodifica para frente um bloco keyframe-a-keyframe e o entrega
+# inteiro, de trás para frente, ao buffer. Enquanto a interface consome um bloco, o
+# próximo (anterior no vídeo) já está sendo decodificado. No máximo dois blocos ficam em
+# memória, limitados por reverse_memory_budget (bytes); sem a lista de keyframes, usa
+# blocos do maior tamanho que cabe no orçamento.
+#
+# Com frame_step > 1 (avanço rápido), só um a cada frame_step frames é entregue; os demais
+# são pulados com grab(), sem retrieve/conversão para BGR.
+class FrameReader:
+    def __init__(self, cap, buffer_size=16, loop=True, keyframes=None, reverse_memory_budget=512 * 1024 * 1024):
+        self.cap = cap
+        self.buffer_size = max(1, int(buffer_size))
+        self.loop = loop
+        self.keyframes = sorted(keyframes) if keyframes else []
+        self.index = None          # video_index.VideoIndex opcional: seeks exatos (fps variável)
+        self.reverse_memory_budget = reverse_memory_budget
+        self.buffer = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        # Posição de decodificação
+        self.reverse = False
+        self.frame_step = 1        # distância entre os frames entregues
+        self.profiler = None       # perf.PerfMonitor opcional: tempo de decodificação por frame
+        self.frame_cache = None    # FrameCache opcional: guarda cada frame decodificado
+        self.next_frame = 0        # próximo frame a ser decodificado
+        self.generation = 0        # incrementado a cada flush; invalida frames em decodificação
+        self._cap_position = 0     # posição atual do cap (próximo frame que read() devolve)
+
+        # Contadores
+        self.frames_decoded = 0
+        self.frames_skipped = 0
+        self.frames_delivered = 0
+        self.underruns = 0
+        self.flushes = 0
+        self.reverse_blocks = 0
+
+    @property
+    def frame_count(self):
+        if self.index is not None:
+            return self.index.frame_count
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    @property
+    def fps(self):
+        return self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="FrameReader", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.buffer.clear()
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    # Retira o próximo frame pronto: (índice, tempo em ms, frame) ou None se o buffer estiver vazio
+    def read(self):
+        with self.condition:
+            if not self.buffer:
+                self.underruns += 1
+                return None
+            item = self.buffer.popleft()
+            self.frames_delivered += 1
+            self.condition.notify_all()
+            return item
+
+    # Descarta os frames já decodificados e reposiciona a decodificação
+    def seek(self, frame_index, reverse=None):
+        with self.condition:
+            self.buffer.clear()
+            self.generation += 1
+            self.flushes += 1
+            if reverse is not None:
+                self.reverse = reverse
+            self.next_frame = max(0, int(frame_index))
+            self.condition.notify_all()
+
+    # Próximo frame pronto, sem retirá-lo do buffer (None se vazio: conta como underrun,
+    # pois a reprodução consulta o buffer com peek() e só chama read() quando há frame)
+    def peek(self):
+        with self.condition:
+            if not self.buffer:
+                self.underruns += 1
+                return None
+            return self.buffer[0]
+
+    # Sem seek pendente, a decodificação chegou ao fim nesta direção e o buffer já foi consumido
+    def finished(self):
+        with self.condition:
+            return self.next_frame < 0 and not self.buffer
+
+    def buffered(self):
+        with self.condition:
+            return len(self.buffer)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'buffered': len(self.buffer),
+                'buffer_size': self.buffer_size,
+                'frames_decoded': self.frames_decoded,
+                'frames_skipped': self.frames_skipped,
+                'frames_delivered': self.frames_delivered,
+                'underruns': self.underruns,
+                'flushes': self.flushes,
+                'reverse_blocks': self.reverse_blocks,
+            }
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # Aguarda espaço no buffer e uma posição válida para decodificar
+                while self.running and (len(self.buffer) >= self._queue_limit() or self.next_frame < 0):
+                    self.condition.wait()
+                if not self.running:
+                    return
+                generation = self.generation
+                position = self.next_frame
+                reverse = self.reverse
+                step = max(1, int(self.frame_step))
+
+            decode_start = time.perf_counter()
+            items = self._decode_reverse_block(position, step) if reverse else self._decode(position)
+            profiler = self.profiler
+            if profiler is not None and items:
+                frame_time = (time.perf_counter() - decode_start) / len(items)
+                for _ in items:
+                    profiler.record("decodificação", frame_time)
+            frame_cache = self.frame_cache
+            if frame_cache is not None:
+                for frame_index, frame_msec, frame in items:
+                    frame_cache.put(frame_index, frame_msec, frame)
+
+            with self.condition:
+                # Um seek/flush aconteceu durante a decodificação: descartar
+                if generation != self.generation:
+                    continue
+                if not items:
+                    if not reverse and self.loop and position > 0:
+                        # Reiniciar o vídeo quando chegar ao fim
+                        self.next_frame = 0
+                    else:
+                        # Nada mais para ler nesta direção: aguardar um seek
+                        self.next_frame = -1
+                    continue
+                self.buffer.extend(items)
+                self.frames_decoded += len(items)
+                self.next_frame = items[-1][0] - step if reverse else position + step
+                self.condition.notify_all()
+
+    # No modo reverso o buffer recebe um bloco inteiro de uma vez; o próximo bloco só é
+    # decodificado quando resta no buffer menos de um bloco
+    def _queue_limit(self):
+        if self.reverse:
+            return max(self.buffer_size, self._max_block_frames())
+        return self.buffer_size
+
+    def _decode(self, position):
+        gap = position - self._cap_position
+        grabbed = False
+        if self._cap_position < 0 or gap < 0 or gap > MAX_GRAB_GAP:
+            grabbed = seek_capture(self.cap, position, self.index)
+            if grabbed is None:
+                self._cap_position = -1
+                return []
+        else:
+            for _ in range(gap):
+                if not self.cap.grab():
+                    self._cap_position = -1
+                    return []
+                self.frames_skipped += 1
+        ret, frame = self.cap.retrieve() if grabbed else self.cap.read()
+        if not ret:
+            self._cap_position = -1
+            return []
+        self._cap_position = position + 1
+        return [(position, self.cap.get(cv2.CAP_PROP_POS_MSEC), frame)]
+
+    # Quantos frames cabem em um bloco reverso (dois blocos por orçamento de memória)
+    def _max_block_frames(self):
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 1
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 1
+        return max(1, self.reverse_memory_budget // (2 * width * height * 3))
+
+    # Decodifica para frente o bloco que termina em "position", começando logo após o
+    # keyframe anterior (ou depois, se o GOP não couber no orçamento), e o devolve invertido.
+    # Só os frames position, position - step, ... são convertidos; os outros, grab().
+    def _decode_reverse_block(self, position, step=1):
+        block_start = max(0, position - self._max_block_frames() + 1)
+        if self.keyframes:
+            index = bisect.bisect_right(self.keyframes, position - SEEK_PREROLL_FRAMES) - 1
+            keyframe = self.keyframes[index] if index >= 0 else 0
+            block_start = max(block_start, keyframe + SEEK_PREROLL_FRAMES if keyframe > 0 else 0)
+
+        grabbed = False
+        if block_start != self._cap_position:
+            grabbed = seek_capture(self.cap, block_start, self.index)
+            if grabbed is None:
+                self._cap_position = -1
+                return []
+        block = []
+        for index in range(block_start, position + 1):
+            # O primeiro frame pode já ter sido lido pelo seek do índice
+            if not grabbed and not self.cap.grab():
+                self._cap_position = -1
+                break
+            grabbed = False
+            if (position - index) % step:
+                self.frames_skipped += 1
+                self._cap_position = index + 1
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                self._cap_position = -1
+                break
+            block.append((index, self.cap.get(cv2.CAP_PROP_POS_MSEC), frame))
+            self._cap_position = index + 1
+        self.reverse_blocks += 1
+        block.reverse()
+        return block
+
+
+# Captura da webcam em uma thread própria que lê o dispositivo continuamente e guarda só
+# o frame mais recente: a fila do driver nunca enche, e a interface sempre pega o frame
+# mais novo, por mais lenta que seja a cadeia de filtros (a latência fica constante; com
+# uma cadeia lenta, frames intermediários são descartados).
+# width/height/fps/fourcc (ex.: 'MJPG') são pedidos ao driver antes da captura; settings()
+# informa o que foi realmente negociado. None mantém o padrão do driver.
+class WebcamCapture:
+    def __init__(self, source=0, width=None, height=None, fps=None, fourcc=None):
+        self.source = source
+        self.requested = {'width': width, 'height': height, 'fps': fps, 'fourcc': fourcc}
+        self.cap = None
+        self.latest = None          # (sequência, instante da captura, frame)
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        # Contadores
+        self.frames_captured = 0
+        self.frames_delivered = 0
+        self.frames_dropped = 0     # sobrescritos antes de serem lidos
+        self.read_failures = 0
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise IOError("Não foi possível acessar a webcam.")
+        # O formato vem antes da resolução: em vários drivers (V4L2, DirectShow) as
+        # resoluções altas a 30 fps só existem em MJPG
+        if self.requested['fourcc']:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.requested['fourcc']))
+        if self.requested['width']:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.requested['width'])
+        if self.requested['height']:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.requested['height'])
+        if self.requested['fps']:
+            self.cap.set(cv2.CAP_PROP_FPS, self.requested['fps'])
+        # Ignorado pelos backends que não suportam; a thread drena a fila de qualquer forma
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return self
+
+    def start(self):
+        if self.cap is None:
+            self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="WebcamCapture", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    # Frame mais recente, se for mais novo que "after" (sequência já exibida); senão None
+    def read_latest(self, after=-1):
+        with self.condition:
+            if self.latest is None or self.latest[0] <= after:
+                return None
+            self.frames_delivered += 1
+            return self.latest
+
+    # Como read_latest, mas espera até timeout (s) por um frame novo
+    def wait_latest(self, after=-1, timeout=0.1):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.running or (self.latest is not None and self.latest[0] > after),
+                                    timeout)
+            return self.read_latest(after)
+
+    # Formato negociado com o driver
+    def settings(self):
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC)) if self.cap is not None else 0
+        return {
+            'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) if self.cap is not None else 0,
+            'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) if self.cap is not None else 0,
+            'fps': self.cap.get(cv2.CAP_PROP_FPS) if self.cap is not None else 0.0,
+            'fourcc': "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00"),
+        }
+
+    def stats(self):
+        with self.condition:
+            return {
+                'frames_captured': self.frames_captured,
+                'frames_delivered': self.frames_delivered,
+                'frames_dropped': self.frames_dropped,
+                'read_failures': self.read_failures,
+            }
+
+    def _run(self):
+        sequence = 0
+        delivered = 0
+        while self.running:
+            ret, frame = self._read()
+            captured_at = time.perf_counter()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            with self.condition:
+                # O frame anterior não chegou a ser lido: descartado
+                if self.latest is not None and self.frames_delivered == delivered:
+                    self.frames_dropped += 1
+                delivered = self.frames_delivered
+                sequence += 1
+                self.latest = (sequence, captured_at, frame)
+                self.frames_captured += 1
+                self.condition.notify_all()
+
+    def _read(self):
+        return self.cap.read()
+
+
+# Arquivo de vídeo lido como uma câmera (várias fontes ao mesmo tempo): no ritmo do fps
+# do arquivo, recomeçando do início ao chegar ao fim
+class FileCapture(WebcamCapture):
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.next_time = None
+
+    def _read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        period = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        now = time.perf_counter()
+        # Sem acumular atraso: se a leitura atrasou, o ritmo recomeça de agora
+        self.next_time = now if self.next_time is None else max(self.next_time + period, now - period)
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+        return ret, frame
+
+
+# Frames originais já decodificados, por índice, com descarte do menos usado recentemente
+# quando o total passa de budget_bytes. Pausa, avanço quadro a quadro e saltos curtos
+# são atendidos daqui, sem passar pelo decodificador. Os frames não são alterados depois
+# de decodificados: o cache guarda referências, sem cópia.
+class FrameCache:
+    def __init__(self, budget_bytes=256 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()  # índice -> (tempo em ms, frame)
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # (tempo em ms, frame) ou None
+    def get(self, frame_index):
+        with self.lock:
+            item = self.entries.get(frame_index)
+            if item is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(frame_index)
+            self.hits += 1
+            return item
+
+    def put(self, frame_index, frame_msec, frame):
+        if frame.nbytes > self.budget_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(frame_index, None)
+            if previous is not None:
+                self.size_bytes -= previous[1].nbytes
+            self.entries[frame_index] = (frame_msec, frame)
+            self.size_bytes += frame.nbytes
+            while self.size_bytes > self.budget_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'frames': len(self.entries),
+                'size_bytes': self.size_bytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# Relógio de apresentação: relaciona o tempo de parede ao tempo do vídeo (timestamps dos
+# frames, em ms), na velocidade e direção pedidas. A interface pergunta quanto falta para
+# cada frame (delay_until) ou quanto ele está atrasado (lateness) e descarta os atrasados.
+# achieved_speed() mede a velocidade realmente obtida na última janela de tempo.
+class PlaybackClock:
+    def __init__(self, speed=1.0, reverse=False, window_seconds=1.0):
+        self.speed = speed
+        self.reverse = reverse
+        self.window_seconds = window_seconds
+        self.anchor_wall = None   # instante de parede (s) em que o vídeo estava em anchor_media
+        self.anchor_media = 0.0   # tempo do vídeo (ms)
+        self.samples = deque()    # (instante de parede, tempo do vídeo) dos frames apresentados
+
+        # Contadores
+        self.frames_presented = 0
+        self.frames_dropped = 0
+
+    @property
+    def anchored(self):
+        return self.anchor_wall is not None
+
+    # Descontinuidade (seek, pausa, troca de direção): o próximo frame apresentado reancora
+    def reset(self, reverse=None):
+        if reverse is not None:
+            self.reverse = reverse
+        self.anchor_wall = None
+        self.samples.clear()
+
+    def anchor(self, media_msec, now=None):
+        self.anchor_wall = time.perf_counter() if now is None else now
+        self.anchor_media = media_msec
+
+    # Muda a velocidade sem salto: reancora no tempo de vídeo atual
+    def set_speed(self, speed, now=None):
+        now = time.perf_counter() if now is None else now
+        if self.anchored:
+            self.anchor(self.media_time(now), now)
+        self.speed = speed
+        self.samples.clear()
+
+    # Tempo do vídeo (ms) que deveria estar na tela agora
+    def media_time(self, now=None):
+        now = time.perf_counter() if now is None else now
+        elapsed = (now - self.anchor_wall) * 1000.0 * self.speed
+        return self.anchor_media - elapsed if self.reverse else self.anchor_media + elapsed
+
+    # Quanto (ms de vídeo) o frame está atrasado; negativo se ainda não chegou a hora dele
+    def lateness(self, frame_msec, now=None):
+        difference = self.media_time(now) - frame_msec
+        return -difference if self.reverse else difference
+
+    # Tempo de parede (ms) até a hora de apresentar o frame
+    def delay_until(self, frame_msec, now=None):
+        return -self.lateness(frame_msec, now) / self.speed
+
+    def presented(self, frame_msec, now=None):
+        now = time.perf_counter() if now is None else now
+        self.frames_presented += 1
+        self.samples.append((now, frame_msec))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window_seconds:
+            self.samples.popleft()
+
+    def dropped(self):
+        self.frames_dropped += 1
+
+    def achieved_speed(self):
+        if len(self.samples) < 2:
+            return 0.0
+        (wall_start, media_start), (wall_end, media_end) = self.samples[0], self.samples[-1]
+        if wall_end <= wall_start:
+            return 0.0
+        return abs(media_end - media_start) / 1000.0 / (wall_end - wall_start)
+
+    def stats(self):
+        return {
+            'speed': self.speed,
+            'achieved_speed': self.achieved_speed(),
+            'frames_presented': self.frames_presented,
+            'frames_dropped': self.frames_dropped,
+        }